@@ -0,0 +1,518 @@
+"""
+Пакетная симуляция уровней на NumPy для подбора сложности.
+Вместо отдельного спрайта на каждый объект состояние N независимых игр хранится в массивах
+(координаты, скорости, занятые ячейки, здоровье, очки), и все игры продвигаются на шаг одновременно.
+Правила появления объектов, роста сложности и прыжков те же, что и в `Simulation`, а столкновения
+проверяются по прямоугольникам, описанным вокруг непрозрачных пикселей картинок, а не по маскам.
+
+Нужен `numpy`, который самой игре не требуется. Пример запуска:
+`python BatchSimulation.py --level main --games 10000 --difficulties 20 50 100 --policy reactive`
+"""
+
+import argparse
+
+import numpy as np
+import pygame
+
+import Sprites
+from Simulation import LevelRules
+
+# Виды объектов уровня. Ноль означает свободную ячейку
+FREE, OBSTACLE, BIRD, BULLET_BOOSTER, HEALTH_BOOSTER, BULLET, ENEMY, ENEMY_ON_PLANE, ENEMY_BULLET = range(9)
+
+KIND_NAMES = {
+    OBSTACLE: 'obstacle', BIRD: 'bird', ENEMY: 'enemy', ENEMY_ON_PLANE: 'enemy_on_plane',
+    ENEMY_BULLET: 'enemy_bullet',
+}
+
+SPRITE_CLASSES = {
+    OBSTACLE: Sprites.ObstacleSprite,
+    BIRD: Sprites.MovingBirdSprite,
+    BULLET_BOOSTER: Sprites.BulletBoosterSprite,
+    HEALTH_BOOSTER: Sprites.HealthBoosterSprite,
+    BULLET: Sprites.BulletSprite,
+    ENEMY: Sprites.EnemySprite,
+    ENEMY_ON_PLANE: Sprites.EnemyOnPlaneSprite,
+    ENEMY_BULLET: Sprites.EnemyBulletSprite,
+}
+
+# Таблицы по видам объектов: размер прямоугольника спрайта и описанный прямоугольник его непрозрачных пикселей
+rect_widths = None
+hitboxes = None
+player_hitboxes = {}
+
+
+def sprite_hitbox(sprite_class):
+    """
+    Возвращает размер спрайта и прямоугольник (x, y, w, h) вокруг непрозрачных пикселей всех его кадров.
+    """
+
+    if hasattr(sprite_class, 'sheet'):
+        sprite_class.cut_sheet()
+        images = sprite_class.frames
+    else:
+        images = [sprite_class.image]
+
+    bounds = [rect for image in images for rect in pygame.mask.from_surface(image).get_bounding_rects()]
+    hitbox = bounds[0].unionall(bounds[1:])
+    return images[0].get_size(), (hitbox.x, hitbox.y, hitbox.w, hitbox.h)
+
+
+def load_hitboxes():
+    global rect_widths, hitboxes
+
+    if hitboxes is not None:
+        return
+
+    rect_widths = np.zeros(len(SPRITE_CLASSES) + 1, np.int32)
+    hitboxes = np.zeros((4, len(SPRITE_CLASSES) + 1), np.int32)
+    for kind, sprite_class in SPRITE_CLASSES.items():
+        (width, _), hitbox = sprite_hitbox(sprite_class)
+        rect_widths[kind] = width
+        hitboxes[:, kind] = hitbox
+
+    for sprite_class in (Sprites.AnimatedPlayerSprite, Sprites.PlayableBird):
+        player_hitboxes[sprite_class] = sprite_hitbox(sprite_class)
+
+
+class EntitySlots:
+    """
+    Объекты уровня всех игр в виде массивов `игра x ячейка`. Свободная ячейка имеет вид `FREE`.
+    Если все ячейки игры заняты, новый объект в ней не появляется.
+    """
+
+    def __init__(self, games: int, capacity: int, width=1280):
+        shape = (games, capacity)
+        self.width = width
+        self.kind = np.zeros(shape, np.int8)
+        self.x = np.zeros(shape, np.int32)
+        self.y = np.zeros(shape, np.int32)
+        # Сдвиг влево за шаг. У пуль игрока он отрицательный
+        self.speed = np.zeros(shape, np.int32)
+        self.is_jumping = np.zeros(shape, bool)
+        self.jump_frames = np.full(shape, 25, np.int32)
+        # Размеры объекта в ячейке запоминаются при появлении, чтобы не искать их по виду каждый шаг
+        self.rect_w = np.zeros(shape, np.int32)
+        self.hitbox_x = np.zeros(shape, np.int32)
+        self.hitbox_y = np.zeros(shape, np.int32)
+        self.hitbox_w = np.zeros(shape, np.int32)
+        self.hitbox_h = np.zeros(shape, np.int32)
+
+    def spawn(self, mask, kind, x, y, speed):
+        free = self.kind == FREE
+        games = np.nonzero(mask & free.any(axis=1))[0]
+        slots = free[games].argmax(axis=1)
+
+        self.kind[games, slots] = kind
+        self.x[games, slots] = x if np.isscalar(x) else x[games]
+        self.y[games, slots] = y if np.isscalar(y) else y[games]
+        self.speed[games, slots] = speed if np.isscalar(speed) else speed[games]
+        self.is_jumping[games, slots] = False
+        self.jump_frames[games, slots] = 25
+        self.rect_w[games, slots] = rect_widths[kind]
+        self.hitbox_x[games, slots], self.hitbox_y[games, slots], self.hitbox_w[games, slots], \
+            self.hitbox_h[games, slots] = hitboxes[:, kind]
+
+    def move(self):
+        self.x -= self.speed
+        gone = np.where(self.speed < 0, self.x > self.width - self.rect_w, self.x < -self.rect_w)
+        self.kind[gone] = FREE
+
+    def jump_arc(self, jump_height=4):
+        """
+        Та же дуга прыжка, что и у `EnemySprite`.
+        """
+
+        arc = self.is_jumping & (self.jump_frames >= -25)
+        frames = self.jump_frames
+        self.y -= np.where(arc, np.round(frames * np.abs(frames) * jump_height / 100).astype(np.int32), 0)
+        self.jump_frames = np.where(arc, frames - 1, frames)
+
+        landed = self.is_jumping & ~arc
+        self.jump_frames[landed] = 25
+        self.is_jumping[landed] = False
+
+    def hitbox(self):
+        return self.x + self.hitbox_x, self.y + self.hitbox_y, self.hitbox_w, self.hitbox_h
+
+    def overlaps(self, x, y, w, h):
+        """
+        Какие объекты пересекаются с прямоугольником игрока. Аргументы - массивы длиной в число игр.
+        """
+
+        left, top, width, height = self.hitbox()
+        x, y = x[:, None], y[:, None]
+        return (self.kind != FREE) & (left < x + w) & (left + width > x) & (top < y + h) & (top + height > y)
+
+
+class BatchLevelSimulation:
+    """
+    Общая часть пакетной симуляции: счетчик шагов, сложность и очки для каждой игры.
+    Закончившиеся игры не меняются, а когда их набирается больше половины, они убираются из массивов.
+    """
+
+    level = None
+    player_class = None
+    player_x = 100
+    player_start_y = 0
+
+    def __init__(self, difficulties, seed=None, capacity=32, width=1280, rules: LevelRules = None):
+        load_hitboxes()
+
+        self.rules = rules or LevelRules()
+        self.difficulty = np.array(difficulties, np.int32)
+        self.start_difficulty = self.difficulty.copy()
+        self.games = len(self.difficulty)
+        self.width = width
+        self.random = np.random.default_rng(seed)
+
+        self.tick = 0
+        self.score = np.zeros(self.games, np.int32)
+        self.game_over = np.zeros(self.games, bool)
+        self.death_tick = np.zeros(self.games, np.int32)
+        self.death_cause = np.zeros(self.games, np.int8)
+
+        # Номера игр, которые еще идут, и итоги всех игр по этим номерам
+        self.game_ids = np.arange(self.games)
+        self.results = {
+            name: np.zeros(self.games, getattr(self, name).dtype)
+            for name in ('start_difficulty', 'score', 'death_tick', 'death_cause')
+        }
+
+        self.entities = EntitySlots(self.games, capacity, width)
+        self.player_y = np.full(self.games, self.player_start_y, np.int32)
+        _, (self.player_hitbox_x, self.player_hitbox_y, self.player_w, self.player_h) = \
+            player_hitboxes[self.player_class]
+
+    @property
+    def playing(self):
+        return ~self.game_over
+
+    @property
+    def move_speed(self):
+        return np.maximum(self.difficulty // self.rules.speed_divisor, self.rules.min_speed)
+
+    def every(self, period: int) -> bool:
+        return self.tick % period == 0
+
+    def chance(self, mask, threshold, inclusive=False):
+        """
+        Аналог `random.randint(0, 100) < threshold` (или `<=`) сразу для всех игр, ограниченный маской.
+        """
+
+        roll = self.random.integers(0, 101, self.games)
+        return mask & (roll <= threshold if inclusive else roll < threshold)
+
+    def player_overlaps(self, slots):
+        return slots.overlaps(
+            np.full(self.games, self.player_x + self.player_hitbox_x), self.player_y + self.player_hitbox_y,
+            self.player_w, self.player_h,
+        ) & self.playing[:, None]
+
+    def finish(self, mask, cause):
+        mask = mask & self.playing
+        self.game_over[mask] = True
+        self.death_tick[mask] = self.tick
+        self.death_cause[mask] = np.broadcast_to(cause, mask.shape)[mask]
+
+    def step(self, **inputs):
+        self.tick += 1
+        if self.every(self.rules.difficulty_change_period):
+            self.difficulty = np.where(
+                self.playing, np.minimum(self.difficulty + 1, self.rules.max_difficulty), self.difficulty,
+            )
+
+        self.handle_input(**inputs)
+        self.handle_timers()
+        self.move()
+        self.update()
+
+    def run(self, policy, max_ticks=100_000):
+        """
+        Продвигает все игры, пока они не закончатся. `policy(sim)` возвращает ввод для `step` в виде словаря.
+        """
+
+        while self.games and self.tick < max_ticks:
+            self.step(**policy(self))
+            if self.game_over.sum() * 2 > self.games:
+                self.compact()
+
+        self.death_tick[self.playing] = self.tick
+        self.game_over[:] = True
+        self.compact()
+        return self
+
+    def compact(self):
+        """
+        Переносит итоги закончившихся игр в `results` и убирает эти игры из массивов,
+        чтобы несколько долгих игр не заставляли каждый шаг обрабатывать все остальные.
+        """
+
+        done = self.game_over
+        ids = self.game_ids[done]
+        for name, values in self.results.items():
+            values[ids] = getattr(self, name)[done]
+
+        keep = ~done
+        for owner in (self, *self.slots()):
+            for name, value in vars(owner).items():
+                if isinstance(value, np.ndarray) and value.shape[:1] == (self.games,):
+                    setattr(owner, name, value[keep])
+        self.games = len(self.game_ids)
+
+    def slots(self):
+        return [self.entities]
+
+    def handle_input(self, **inputs):
+        pass
+
+    def handle_timers(self):
+        pass
+
+    def move(self):
+        self.entities.move()
+
+    def update(self):
+        pass
+
+
+class BatchMainLevelSimulation(BatchLevelSimulation):
+    level = 'main'
+    player_class = Sprites.AnimatedPlayerSprite
+    player_start_y = 320
+
+    def __init__(self, difficulties, seed=None, capacity=32, width=1280, rules=None):
+        super().__init__(difficulties, seed=seed, capacity=capacity, width=width, rules=rules)
+        self.health = np.full(self.games, 3, np.int32)
+        self.bullets_left = np.full(self.games, 5, np.int32)
+        self.player_jumping = np.zeros(self.games, bool)
+        self.player_jump_frames = np.full(self.games, 25, np.int32)
+        self.bullets = EntitySlots(self.games, 16, width)
+
+    def slots(self):
+        return [self.entities, self.bullets]
+
+    def handle_input(self, jump=None, fire=None):
+        if jump is not None:
+            self.player_jumping |= jump & self.playing
+
+        if fire is not None:
+            fire = fire & self.playing & (self.bullets_left > 0)
+            self.bullets_left -= fire
+            (width, height), _ = player_hitboxes[self.player_class]
+            self.bullets.spawn(
+                fire, BULLET, x=self.player_x + width // 2 + 80, y=self.player_y + height // 2 - 23, speed=-10,
+            )
+
+    def handle_timers(self):
+        playing, speed = self.playing, self.move_speed
+
+        if self.every(self.rules.obstacle_spawn_period):
+            bullet_booster = self.chance(playing, self.rules.bullet_booster_chance, inclusive=True)
+            health_booster = self.chance(
+                playing & ~bullet_booster, self.rules.health_booster_chance, inclusive=True,
+            )
+            obstacle = self.chance(playing & ~bullet_booster & ~health_booster, self.difficulty)
+            self.entities.spawn(bullet_booster, BULLET_BOOSTER, x=self.width, y=540, speed=speed)
+            self.entities.spawn(health_booster, HEALTH_BOOSTER, x=self.width, y=510, speed=speed)
+            self.entities.spawn(obstacle, OBSTACLE, x=self.width, y=515, speed=speed)
+
+        if self.every(self.rules.bird_spawn_period):
+            self.entities.spawn(self.chance(playing, self.difficulty), BIRD, x=self.width, y=150, speed=speed)
+
+        if self.every(self.rules.add_score_period):
+            self.score += playing
+
+    def move(self):
+        # Та же дуга прыжка, что и у `AnimatedPlayerSprite`
+        arc = self.player_jumping & (self.player_jump_frames >= -25)
+        frames = self.player_jump_frames
+        self.player_y -= np.where(arc, np.round(frames * np.abs(frames) * 4 / 100).astype(np.int32), 0)
+        self.player_jump_frames = np.where(arc, frames - 1, frames)
+        landed = self.player_jumping & ~arc
+        self.player_jump_frames[landed] = 25
+        self.player_jumping[landed] = False
+
+        self.entities.move()
+        self.bullets.move()
+
+    def update(self):
+        entities = self.entities
+        hits = self.player_overlaps(entities)
+
+        damage = hits & ((entities.kind == OBSTACLE) | (entities.kind == BIRD))
+        hurt = damage.any(axis=1)
+        # Если игрок врезался в несколько объектов, причиной проигрыша считается вид с наибольшим кодом:
+        # птица важнее препятствия, как и в `MainLevelSimulation`
+        cause = np.where(damage, entities.kind, FREE).max(axis=1)
+        self.health -= hurt
+        self.finish(hurt & (self.health <= 0), cause)
+
+        self.bullets_left += (hits & (entities.kind == BULLET_BOOSTER)).any(axis=1)
+        healed = (hits & (entities.kind == HEALTH_BOOSTER)).any(axis=1)
+        self.health = np.where(healed, np.minimum(self.health + 1, 3), self.health)
+
+        entities.kind[hits] = FREE
+
+        # Пули против птиц: попарно, но только в тех играх, где есть и пули, и птицы
+        bullets = self.bullets
+        games = np.nonzero((bullets.kind == BULLET).any(axis=1) & (entities.kind == BIRD).any(axis=1))[0]
+        if not len(games):
+            return
+
+        bx, by, bw, bh = (array[games, :, None] for array in bullets.hitbox())
+        ex, ey, ew, eh = (array[games, None, :] for array in entities.hitbox())
+        shot = (
+            (bullets.kind[games] == BULLET)[:, :, None] & (entities.kind[games] == BIRD)[:, None, :]
+            & (bx < ex + ew) & (bx + bw > ex) & (by < ey + eh) & (by + bh > ey)
+        )
+        bullets.kind[games] = np.where(shot.any(axis=2), FREE, bullets.kind[games])
+        entities.kind[games] = np.where(shot.any(axis=1), FREE, entities.kind[games])
+
+
+class BatchImABirdLevelSimulation(BatchLevelSimulation):
+    level = 'bird'
+    player_class = Sprites.PlayableBird
+    player_start_y = 220
+    enemy_bullet_y = 420
+    plane_bullet_y = 180
+
+    def __init__(self, difficulties, seed=None, capacity=32, width=1280, rules=None):
+        super().__init__(difficulties, seed=seed, capacity=capacity, width=width, rules=rules)
+        self.direction = np.zeros(self.games, np.int8)
+
+    def handle_input(self, direction=None):
+        if direction is not None:
+            self.direction = np.asarray(direction, np.int8)
+
+    def handle_timers(self):
+        if not self.every(self.rules.enemy_spawn_period):
+            return
+
+        playing, speed = self.playing, self.move_speed
+        enemy = self.chance(playing, self.difficulty)
+        plane = self.chance(playing & ~enemy, self.difficulty)
+
+        self.entities.spawn(enemy, ENEMY, x=self.width, y=320, speed=speed)
+        self.entities.spawn(enemy, ENEMY_BULLET, x=self.width, y=self.enemy_bullet_y, speed=10)
+        self.entities.spawn(plane, ENEMY_ON_PLANE, x=self.width, y=100, speed=speed)
+        self.entities.spawn(plane, ENEMY_BULLET, x=self.width, y=self.plane_bullet_y, speed=10)
+
+    def move(self):
+        entities = self.entities
+        entities.move()
+
+        # Как и `EnemySprite`, наземный враг иногда прыгает, пока не прошел середину экрана
+        roll = self.random.integers(0, 101, entities.kind.shape)
+        entities.is_jumping |= (entities.kind == ENEMY) & (entities.x >= 500) & (roll <= 1)
+        entities.jump_arc()
+
+    def update(self):
+        (_, height), _ = player_hitboxes[self.player_class]
+        up = (self.direction < 0) & (self.player_y > 10)
+        down = (self.direction > 0) & (self.player_y < 540 - height)
+        self.player_y += np.where(up & self.playing, -15, 0) + np.where(down & self.playing, 15, 0)
+
+        entities = self.entities
+        hits = self.player_overlaps(entities)
+
+        self.finish((hits & (entities.kind == ENEMY_BULLET)).any(axis=1), ENEMY_BULLET)
+
+        caught = hits & ((entities.kind == ENEMY) | (entities.kind == ENEMY_ON_PLANE))
+        self.score += caught.any(axis=1)
+        entities.kind[hits] = FREE
+
+
+BATCH_SIMULATIONS = {
+    'main': BatchMainLevelSimulation,
+    'bird': BatchImABirdLevelSimulation,
+}
+
+
+def random_policy(jump_probability=0.02, fire_probability=0.01, turn_probability=0.05):
+    """
+    Случайный игрок: в основном уровне иногда прыгает и стреляет, в уровне птицы иногда меняет направление.
+    """
+
+    def policy(sim):
+        if sim.level == 'main':
+            return {
+                'jump': sim.random.random(sim.games) < jump_probability,
+                'fire': sim.random.random(sim.games) < fire_probability,
+            }
+
+        turn = sim.random.random(sim.games) < turn_probability
+        return {'direction': np.where(turn, sim.random.integers(-1, 2, sim.games), sim.direction)}
+
+    return policy
+
+
+def reactive_policy(jump_distance=(0, 40), fire_distance=700):
+    """
+    Игрок, который смотрит на ближайшие объекты: прыгает через препятствия, стреляет в птиц,
+    а в уровне птицы держится между полосами вражеских пуль.
+    """
+
+    def policy(sim):
+        entities = sim.entities
+        (player_width, _), _ = player_hitboxes[sim.player_class]
+        ahead = entities.x - (sim.player_x + player_width)
+
+        if sim.level == 'main':
+            near_obstacle = (entities.kind == OBSTACLE) & (ahead >= jump_distance[0]) & (ahead <= jump_distance[1])
+            near_bird = (entities.kind == BIRD) & (ahead >= 0) & (ahead <= fire_distance)
+            return {'jump': near_obstacle.any(axis=1), 'fire': near_bird.any(axis=1) & ~sim.bullets.kind.any(axis=1)}
+
+        # Между полосами вражеских пуль есть узкий коридор, в котором игрок задевает обоих врагов, но не пули
+        top = sim.player_y + sim.player_hitbox_y
+        corridor = (sim.plane_bullet_y + 12 + sim.enemy_bullet_y - sim.player_h) // 2
+        return {'direction': np.where(np.abs(corridor - top) > 7, np.sign(corridor - top), 0)}
+
+    return policy
+
+
+POLICIES = {
+    'random': random_policy,
+    'reactive': reactive_policy,
+}
+
+
+def score_distributions(level, difficulties, games=1000, policy=None, seed=None, max_ticks=100_000, rules=None):
+    """
+    Проводит `games` игр для каждой начальной сложности и возвращает словарь `сложность -> массив очков`.
+    """
+
+    difficulties = list(difficulties)
+    sim = BATCH_SIMULATIONS[level](np.repeat(difficulties, games), seed=seed, rules=rules)
+    sim.run(policy or random_policy(), max_ticks=max_ticks)
+
+    scores, start_difficulty = sim.results['score'], sim.results['start_difficulty']
+    return {difficulty: scores[start_difficulty == difficulty] for difficulty in difficulties}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Распределение очков по начальной сложности уровня')
+    parser.add_argument('--level', choices=BATCH_SIMULATIONS, default='main')
+    parser.add_argument('--games', type=int, default=1000, help='игр на каждую сложность')
+    parser.add_argument('--difficulties', type=int, nargs='+', default=[20, 50, 100])
+    parser.add_argument('--policy', choices=POLICIES, default='random')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--max-ticks', type=int, default=100_000)
+    args = parser.parse_args()
+
+    distributions = score_distributions(
+        args.level, args.difficulties, games=args.games, policy=POLICIES[args.policy](),
+        seed=args.seed, max_ticks=args.max_ticks,
+    )
+
+    print('сложность  игр      среднее  p10  p50  p90  максимум')
+    for difficulty, scores in distributions.items():
+        p10, p50, p90 = np.percentile(scores, [10, 50, 90])
+        print(
+            f'{difficulty:<10} {len(scores):<8} {scores.mean():<8.1f} {p10:<4.0f} {p50:<4.0f} {p90:<4.0f} '
+            f'{scores.max()}'
+        )
+
+
+if __name__ == '__main__':
+    main()
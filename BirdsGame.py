@@ -1,17 +1,37 @@
-import sqlite3
 from dataclasses import dataclass, field
-from typing import Tuple
+from typing import Tuple, Dict, Any
 
 import pygame
 
 import GameLoops
+from FrameProfiler import FrameProfiler
+from Leaderboard import Leaderboard
 from StateMachine import StateMachine, GameState
+from TextCache import TextCache
+from Viewport import Viewport
 
 
 @dataclass
 class BirdsGame:
     screen: pygame.Surface
     fullscreen: bool
+    # Частота кадров активных уровней. Скорость игры от нее не зависит: симуляция идет шагами постоянной длины
+    target_fps: int = 60
+    # Частота перерисовки статичных экранов без ввода. 0 - ждать ввода бесконечно
+    idle_fps: int = 0
+    # Выводить на экран только изменившиеся области кадра вместо полной перерисовки
+    dirty_rects: bool = False
+    # Папка, в которую сохраняются записи ввода законченных игр. None - не сохранять
+    replays_dir: str = None
+    leaderboard_path: str = 'leaderboard.sqlite'
+    # Размер, в котором рисуется кадр. Игра всегда идет в координатах 1280x720, а меньший кадр, например 640x360,
+    # растягивается до окна видеокартой. None - рисовать в 1280x720
+    render_size: Tuple[int, int] = None
+    # Плывущие облака на уровнях - прокручиваемая полоса `ParallaxLayer`. По умолчанию уровни без них
+    parallax: bool = False
+    # Окно со временем фаз кадра (включается и выключается клавишей F3) и JSONL-файл для статистики кадров
+    profile_overlay: bool = False
+    profile_path: str = None
 
     width: int = field(init=False, default=1280)
     height: int = field(init=False, default=720)
@@ -19,23 +39,33 @@ class BirdsGame:
 
     state_machine: StateMachine = field(init=False, default=None)
     clock: pygame.time.Clock = field(init=False, default=None)
+    text_cache: TextCache = field(init=False, default=None)
+    leaderboard: Leaderboard = field(init=False, default=None)
+    profiler: FrameProfiler = field(init=False, default=None)
+    viewport: Viewport = field(init=False, default=None)
 
     all_sprites: pygame.sprite.Group = field(init=False, default=None)
-    obstacle_sprites: pygame.sprite.Group = field(init=False, default=None)
-    birds_sprites: pygame.sprite.Group = field(init=False, default=None)
-    bullet_booster_sprites: pygame.sprite.Group = field(init=False, default=None)
-    health_booster_sprites: pygame.sprite.Group = field(init=False, default=None)
-    running_people_sprites: pygame.sprite.Group = field(init=False, default=None)
-    enemies_sprites: pygame.sprite.Group = field(init=False, default=None)
     pause_menu: pygame.sprite.Group = field(init=False, default=None)
 
     game_loops: Tuple = field(init=False, default_factory=tuple)
+    loops_by_state: Dict[GameState, Any] = field(init=False, default_factory=dict)
 
     @classmethod
-    def create(cls, fullscreen=False):
+    def create(cls, fullscreen=False, target_fps=60, idle_fps=0, dirty_rects=False, replays_dir=None,
+               leaderboard_path='leaderboard.sqlite', render_size=None, parallax=False, profile_overlay=False,
+               profile_path=None):
         game = cls(
             screen=None,
             fullscreen=fullscreen,
+            target_fps=target_fps,
+            idle_fps=idle_fps,
+            dirty_rects=dirty_rects,
+            replays_dir=replays_dir,
+            leaderboard_path=leaderboard_path,
+            render_size=render_size,
+            parallax=parallax,
+            profile_overlay=profile_overlay,
+            profile_path=profile_path,
         )
         game.init()
         return game
@@ -49,29 +79,21 @@ class BirdsGame:
             GameLoops.RecordsTableLoop(game=self),
             GameLoops.ImABirdLevelLoop(game=self),
         )
+        self.loops_by_state = {game_loop.linked_game_state: game_loop for game_loop in self.game_loops}
 
         self.state_machine = StateMachine(self.game_loops, GameState.INITIALIZING)
 
-        connection = sqlite3.connect('leaderboard.sqlite')
-        cursor = connection.cursor()
-
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS main_level (
-            score INTEGER
-        )""")
-
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS im_a_bird_level (
-            score INTEGER
-        )""")
-
-        connection.commit()
-        connection.close()
+        self.leaderboard = Leaderboard(self.leaderboard_path)
+        self.leaderboard.open()
 
         pygame.init()
+        self.viewport = Viewport(self.size, tuple(self.render_size or self.size))
         window_style = pygame.FULLSCREEN if self.fullscreen else 0
-        bit_depth = pygame.display.mode_ok(self.size, window_style, 32)
-        self.screen = pygame.display.set_mode(self.size, window_style, bit_depth)
+        if self.viewport.scaled:
+            # Окно или экран больше кадра, и кадр растягивается до них при выводе, а не на процессоре
+            window_style |= pygame.SCALED
+        bit_depth = pygame.display.mode_ok(self.viewport.size, window_style, 32)
+        self.screen = pygame.display.set_mode(self.viewport.size, window_style, bit_depth)
 
         pygame.mixer.pre_init(
             frequency=44100,
@@ -83,13 +105,10 @@ class BirdsGame:
         pygame.font.init()
 
         self.clock = pygame.time.Clock()
+        self.text_cache = TextCache()
+        self.profiler = FrameProfiler(overlay=self.profile_overlay, dump_path=self.profile_path)
 
         self.all_sprites = pygame.sprite.Group()
-        self.obstacle_sprites = pygame.sprite.Group()
-        self.birds_sprites = pygame.sprite.Group()
-        self.bullet_booster_sprites = pygame.sprite.Group()
-        self.health_booster_sprites = pygame.sprite.Group()
-        self.enemies_sprites = pygame.sprite.Group()
         self.pause_menu = pygame.sprite.Group()
 
         self.state_machine.set_state(GameState.INITIALIZED)
@@ -100,9 +119,63 @@ class BirdsGame:
         self.loop()
 
     def loop(self):
+        events = pygame.event.get()
+        self.profiler.begin_frame()
         while self.state_machine.state != GameState.QUITTING:
-            for game_loop in self.game_loops:
-                if game_loop.linked_game_state == self.state_machine.state:
-                    game_loop.loop()
-
+            state = self.state_machine.state
+            game_loop = self.loops_by_state[state]
+            game_loop.loop(events)
+            self.draw_profiler_overlay()
+
+            if self.state_machine.state != state:
+                # Новый экран должен отрисоваться сразу, не дожидаясь ввода
+                events = pygame.event.get()
+            else:
+                events = self.wait_next_frame(game_loop)
+
+            self.profiler.mark('wait')
+            self.end_profiler_frame(game_loop)
+            for event in events:
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                    self.profiler.toggle_overlay()
+
+        if self.profile_path is not None:
+            self.profiler.dump(self.profile_path)
+        self.leaderboard.close()
         pygame.quit()
+
+    def draw_profiler_overlay(self):
+        if not self.profiler.overlay:
+            return
+
+        # Кадр уже выведен на экран, поэтому окно статистики выводится поверх отдельно
+        pygame.display.update(self.profiler.draw_overlay(self.screen))
+        self.profiler.mark('flip')
+
+    def end_profiler_frame(self, game_loop):
+        if not self.profiler.enabled:
+            return
+
+        entities = {'sprites': len(self.all_sprites)}
+        if isinstance(game_loop, GameLoops.LevelLoop) and game_loop.simulation is not None:
+            entities['simulation'] = len(game_loop.simulation.entities)
+        self.profiler.end_frame(**entities)
+
+    def wait_next_frame(self, game_loop) -> list:
+        """
+        Выдерживает паузу до следующего кадра и возвращает накопившиеся за неё ивенты.
+        Активные уровни идут с частотой `target_fps`, статичные экраны спят до первого ивента
+        (или до истечения `1 / idle_fps` секунды, если `idle_fps` задан).
+        """
+
+        if not game_loop.static_screen:
+            self.clock.tick(self.target_fps)
+            return pygame.event.get()
+
+        idle_timeout = 1000 // self.idle_fps if self.idle_fps else 0
+        first_event = pygame.event.wait(idle_timeout)
+        self.clock.tick()
+
+        if first_event.type == pygame.NOEVENT:
+            return pygame.event.get()
+        return [first_event, *pygame.event.get()]
@@ -0,0 +1,170 @@
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Tuple
+
+import pygame
+
+
+@dataclass
+class ParallaxLayer:
+    """
+    Полоса, которая прокручивается влево со скоростью `speed` пикселей за шаг симуляции.
+    Картинка заранее повторена по ширине экрана и еще одной своей ширине, поэтому кадр полосы -
+    это один `blit` части готовой поверхности со сдвигом, без склейки на лету.
+    """
+
+    strip: pygame.Surface
+    y: int
+    speed: float
+    # Ширина экрана и период повторения картинки
+    width: int
+    period: int
+
+    @classmethod
+    def from_image(cls, image: pygame.Surface, width: int, y: int, speed: float,
+                   background=None) -> 'ParallaxLayer':
+        """
+        Собирает полосу из картинки. Если под полосой однотонный фон цвета `background`, картинка заранее
+        накладывается на него, и полоса выводится непрозрачной - без смешивания каждого пикселя в каждом кадре.
+        """
+
+        period = image.get_width()
+        size = (width + period, image.get_height())
+        positions = range(0, width + period, period)
+
+        if background is not None:
+            strip = pygame.Surface(size).convert()
+            strip.fill(background)
+            strip.blits([(image, (x, 0)) for x in positions], doreturn=False)
+            return cls(strip, y, speed, width, period)
+
+        strip = pygame.Surface(size, image.get_flags(), image)
+        color_key = image.get_colorkey()
+        if color_key is not None:
+            # Прозрачные по цветовому ключу точки при копировании пропускаются, поэтому полоса заливается им
+            strip.fill(color_key)
+            strip.set_colorkey(color_key)
+        # Полоса с альфа-каналом изначально прозрачна, и сложение копирует пиксели без смешивания,
+        # которое затемнило бы полупрозрачные края
+        flags = pygame.BLEND_RGBA_ADD if image.get_flags() & pygame.SRCALPHA else 0
+        strip.blits([(image, (x, 0), None, flags) for x in positions], doreturn=False)
+        return cls(strip, y, speed, width, period)
+
+    @property
+    def rect(self) -> pygame.Rect:
+        return pygame.Rect(0, self.y, self.width, self.strip.get_height())
+
+    def blit_args(self, scroll: float) -> tuple:
+        offset = round(scroll * self.speed) % self.period
+        return self.strip, (0, self.y), pygame.Rect(offset, 0, self.width, self.strip.get_height())
+
+
+@dataclass
+class Compositor:
+    """
+    Кадр из слоев: неподвижный фон, прокручиваемые полосы, интерфейс и движущиеся объекты.
+    Фон собирается один раз, а интерфейс пересобирается только тогда, когда меняется его состояние,
+    и впечатывается в копию фона, так что всё неподвижное в кадре - один `blit`. Только надписи интерфейса,
+    которые перекрывают прокручиваемые полосы, рисуются в каждом кадре поверх полос и объектов.
+
+    В режиме `dirty` на экран выводятся только изменившиеся области: места прошлых объектов и полосы
+    восстанавливаются из собранного фона, а впечатанный интерфейс выводится только при изменении.
+    """
+
+    background: pygame.Surface = None
+    parallax: List[ParallaxLayer] = field(default_factory=list)
+
+    # Состояние, по которому собран интерфейс, и области всех его надписей
+    hud_state: Any = field(init=False, default=None)
+    hud_rects: List[pygame.Rect] = field(init=False, default_factory=list)
+    # Надписи интерфейса поверх полос в виде пар (поверхность, позиция) и их области
+    top_blits: list = field(init=False, default_factory=list)
+    top_rects: List[pygame.Rect] = field(init=False, default_factory=list)
+    # Области интерфейса, которые нужно вывести заново в режиме `dirty`
+    changed_rects: List[pygame.Rect] = field(init=False, default_factory=list)
+
+    # Фон вместе с впечатанным интерфейсом
+    frame: pygame.Surface = field(init=False, default=None)
+    entity_rects: List[pygame.Rect] = field(init=False, default_factory=list)
+    full_redraw: bool = field(init=False, default=True)
+
+    def invalidate(self):
+        """
+        Следующий кадр будет нарисован и выведен целиком, например после паузы или другого экрана.
+        """
+
+        self.full_redraw = True
+
+    def set_hud(self, state, build):
+        """
+        Пересобирает интерфейс вызовом `build()`, если `state` отличается от прошлого.
+        """
+
+        if self.frame is not None and state == self.hud_state:
+            return
+
+        self.hud_state = state
+        hud_blits = build()
+        old_rects = self.hud_rects
+        self.hud_rects = [pygame.Rect(position, surface.get_size()) for surface, position in hud_blits]
+        self.changed_rects = old_rects + self.hud_rects
+
+        strip_rects = [layer.rect for layer in self.parallax]
+        baked = []
+        self.top_blits, self.top_rects = [], []
+        for blit, rect in zip(hud_blits, self.hud_rects):
+            if rect.collidelist(strip_rects) == -1:
+                baked.append(blit)
+            else:
+                self.top_blits.append(blit)
+                self.top_rects.append(rect)
+
+        self.frame = self.background
+        if baked:
+            self.frame = self.background.copy()
+            self.frame.blits(baked, doreturn=False)
+
+    def draw(self, screen: pygame.Surface, entities: list, scroll: float = 0, dirty=False) -> Optional[List]:
+        """
+        Рисует кадр с объектами `entities` - парами (картинка, позиция). Возвращает области,
+        которые нужно передать в `pygame.display.update`, или None, если экран нужно вывести целиком.
+        """
+
+        if self.frame is None:
+            self.set_hud(None, list)
+        strips = [layer.blit_args(scroll) for layer in self.parallax]
+        hud = self.top_blits
+
+        if not dirty or self.full_redraw:
+            screen.blit(self.frame, (0, 0))
+            screen.blits(strips, doreturn=False)
+            self.entity_rects = screen.blits(entities)
+            screen.blits(hud, doreturn=False)
+            self.changed_rects = []
+            self.full_redraw = False
+            return None
+
+        # Полосы сдвигаются каждый кадр, а сквозь прозрачные места полос и интерфейса поверх них виден фон,
+        # поэтому фон под ними тоже восстанавливается
+        strip_rects = [layer.rect for layer in self.parallax]
+        restored = self.entity_rects + self.changed_rects + strip_rects + self.top_rects
+        for rect in restored:
+            screen.blit(self.frame, rect, rect)
+
+        screen.blits(strips, doreturn=False)
+        self.entity_rects = screen.blits(entities)
+        screen.blits(hud, doreturn=False)
+        self.changed_rects = []
+
+        return restored + self.entity_rects
+
+
+def bake(size: Tuple[int, int], blits: list, color=None) -> pygame.Surface:
+    """
+    Собирает неподвижный слой из пар (картинка, позиция) в одну поверхность в формате экрана.
+    """
+
+    surface = pygame.Surface(size).convert()
+    if color is not None:
+        surface.fill(color)
+    surface.blits(blits, doreturn=False)
+    return surface
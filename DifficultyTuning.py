@@ -0,0 +1,231 @@
+"""
+Подбор сложности методом Монте-Карло: много игр без экрана для каждой комбинации правил из сетки.
+Игры раздаются процессам `ProcessPoolExecutor` пачками, у каждой пачки свой seed, поэтому результат
+не зависит от числа процессов и порядка их работы. Итоги по каждой комбинации правил дописываются в CSV
+в порядке сетки: как только готовы все пачки комбинации и все строки перед ней. Пример запуска:
+
+`python DifficultyTuning.py --level main --games 2000 --grid difficulty_change_period=150,300,600
+ --grid speed_divisor=5,10 --output tuning.csv`
+
+Движок `sprites` - точная симуляция из `Simulation`, `batch` - быстрая на NumPy из `BatchSimulation`.
+"""
+
+import os
+
+# Процессы пишут в тот же stdout, что и CSV, поэтому приветствие pygame отключается до импорта
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import csv
+import itertools
+import random
+import statistics
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, fields, replace
+
+from Simulation import LevelRules, MainLevelSimulation, ImABirdLevelSimulation
+from Sprites import TICKS_PER_SECOND
+
+SIMULATIONS = {
+    'main': MainLevelSimulation,
+    'bird': ImABirdLevelSimulation,
+}
+
+# Причины проигрыша на каждом уровне. `survived` - игра дошла до ограничения по числу шагов
+DEATH_CAUSES = {
+    'main': ['obstacle', 'bird', 'survived'],
+    'bird': ['enemy_bullet', 'survived'],
+}
+
+
+def random_inputs(sim, rng: random.Random):
+    if sim.level == 'main':
+        if rng.random() < 0.02:
+            sim.jump()
+        if rng.random() < 0.01:
+            sim.fire()
+    elif rng.random() < 0.05:
+        sim.direction = rng.randint(-1, 1)
+
+
+def reactive_inputs(sim, rng: random.Random):
+    player = sim.player.rect
+
+    if sim.level == 'main':
+        if any(0 <= sprite.rect.x - player.right <= 40
+               for sprite in sim.obstacle_sprites if not sim.birds_sprites.has(sprite)):
+            sim.jump()
+        if not sim.bullet_sprites and any(0 <= bird.rect.x - player.right <= 700 for bird in sim.birds_sprites):
+            sim.fire()
+        return
+
+    # Коридор между полосами вражеских пуль (y = 180 и y = 420), в котором игрок задевает врагов, но не пули
+    corridor = (180 + 12 + 420 - player.h) // 2
+    sim.direction = 0 if abs(corridor - player.y) <= 7 else (1 if corridor > player.y else -1)
+
+
+POLICIES = {
+    'random': random_inputs,
+    'reactive': reactive_inputs,
+}
+
+
+def play_sprite_games(level, rules, games, seed, policy, max_ticks):
+    """
+    Играет `games` игр точной симуляцией. Возвращает список (очки, шаги, причина проигрыша).
+    """
+
+    # Каждая игра получает свой seed, а ввод берется из отдельного генератора
+    seeds = random.Random(seed)
+    inputs = random.Random(seed + 1)
+    handle_inputs = POLICIES[policy]
+
+    results = []
+    for _ in range(games):
+        sim = SIMULATIONS[level](rules=rules, seed=seeds.getrandbits(32))
+        while not sim.game_over and sim.tick < max_ticks:
+            handle_inputs(sim, inputs)
+            sim.step()
+
+        results.append((sim.score, sim.tick, sim.death_cause or 'survived'))
+        # Объекты уровня возвращаются в пулы, чтобы следующая игра брала их оттуда
+        sim.release()
+
+    return results
+
+
+def play_batch_games(level, rules, games, seed, policy, max_ticks):
+    """
+    То же, что `play_sprite_games`, но на NumPy: все игры пачки идут одновременно.
+    """
+
+    import BatchSimulation
+
+    sim = BatchSimulation.BATCH_SIMULATIONS[level]([rules.start_difficulty] * games, seed=seed, rules=rules)
+    sim.run(BatchSimulation.POLICIES[policy](), max_ticks=max_ticks)
+
+    results = sim.results
+    return [
+        (int(score), int(ticks), BatchSimulation.KIND_NAMES.get(int(cause), 'survived'))
+        for score, ticks, cause in zip(results['score'], results['death_tick'], results['death_cause'])
+    ]
+
+
+ENGINES = {
+    'sprites': play_sprite_games,
+    'batch': play_batch_games,
+}
+
+
+def parse_grid(values):
+    """
+    Превращает аргументы вида `поле=1,2,3` в список наборов правил - все сочетания значений.
+    """
+
+    names = {field.name for field in fields(LevelRules)}
+    axes = {}
+    for value in values:
+        name, _, options = value.partition('=')
+        if name not in names:
+            raise ValueError(f'Неизвестное правило {name!r}, доступны: {", ".join(sorted(names))}')
+        axes[name] = [int(option) for option in options.split(',')]
+
+    return [
+        replace(LevelRules(), **dict(zip(axes, combination))) for combination in itertools.product(*axes.values())
+    ]
+
+
+def summarize(level, rules, results):
+    scores = sorted(score for score, _, _ in results)
+    seconds = sorted(ticks / TICKS_PER_SECOND for _, ticks, _ in results)
+    causes = [cause for _, _, cause in results]
+
+    # При одной игре квантили не считаются, поэтому она повторяется
+    score_deciles = statistics.quantiles(scores * 2 if len(scores) < 2 else scores, n=10, method='inclusive')
+    survival_deciles = statistics.quantiles(seconds * 2 if len(seconds) < 2 else seconds, n=10, method='inclusive')
+
+    row = asdict(rules)
+    row.update({
+        'games': len(results),
+        'score_mean': round(statistics.fmean(scores), 3),
+        'score_p10': score_deciles[0],
+        'score_p50': score_deciles[4],
+        'score_p90': score_deciles[8],
+        'survival_p10_s': round(survival_deciles[0], 2),
+        'survival_median_s': round(statistics.median(seconds), 2),
+        'survival_p90_s': round(survival_deciles[8], 2),
+    })
+    for cause in DEATH_CAUSES[level]:
+        row[f'deaths_{cause}' if cause != 'survived' else cause] = causes.count(cause)
+
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Перебор правил уровня на множестве игр без экрана')
+    parser.add_argument('--level', choices=SIMULATIONS, default='main')
+    parser.add_argument('--engine', choices=ENGINES, default='sprites')
+    parser.add_argument('--policy', choices=POLICIES, default='random')
+    parser.add_argument('--grid', action='append', default=[], metavar='ПРАВИЛО=ЗНАЧЕНИЯ',
+                        help='например difficulty_change_period=150,300,600; можно указать несколько раз')
+    parser.add_argument('--games', type=int, default=1000, help='игр на каждый набор правил')
+    parser.add_argument('--chunk-size', type=int, default=None, help='игр в одной задаче для процесса')
+    parser.add_argument('--workers', type=int, default=None, help='по умолчанию по числу ядер')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-ticks', type=int, default=60 * TICKS_PER_SECOND * 10)
+    parser.add_argument('--output', default='-', help='CSV-файл, `-` - стандартный вывод')
+    args = parser.parse_args()
+
+    try:
+        grid = parse_grid(args.grid)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.games < 1:
+        parser.error('--games должно быть не меньше 1')
+    if args.chunk_size is not None and args.chunk_size < 1:
+        parser.error('--chunk-size должно быть не меньше 1')
+
+    chunk_size = args.chunk_size or (20 if args.engine == 'sprites' else 2000)
+    chunks = [min(chunk_size, args.games - start) for start in range(0, args.games, chunk_size)]
+    play = ENGINES[args.engine]
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', newline='', encoding='utf-8')
+    writer = None
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        tasks = {}
+        for point, rules in enumerate(grid):
+            for chunk, games in enumerate(chunks):
+                # Seed задачи зависит только от общего seed и ее места в сетке
+                seed = random.Random(f'{args.seed}:{point}:{chunk}').getrandbits(32)
+                future = executor.submit(play, args.level, rules, games, seed, args.policy, args.max_ticks)
+                tasks[future] = point, chunk
+
+        # Пачки хранятся по своим местам, а готовые комбинации ждут, пока не будут записаны все предыдущие,
+        # поэтому ни порядок строк, ни порядок игр внутри комбинации не зависят от того,
+        # какая задача закончилась раньше
+        results = {point: [None] * len(chunks) for point in range(len(grid))}
+        pending = {point: len(chunks) for point in range(len(grid))}
+        next_point = 0
+        for future in as_completed(tasks):
+            point, chunk = tasks[future]
+            results[point][chunk] = future.result()
+            pending[point] -= 1
+
+            while next_point < len(grid) and not pending[next_point]:
+                games = list(itertools.chain.from_iterable(results.pop(next_point)))
+                row = summarize(args.level, grid[next_point], games)
+                if writer is None:
+                    writer = csv.DictWriter(output, fieldnames=list(row))
+                    writer.writeheader()
+                writer.writerow(row)
+                output.flush()
+                next_point += 1
+
+    if output is not sys.stdout:
+        output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+import pygame
+
+
+@dataclass
+class EntityArena:
+    """
+    Все объекты и группы одной игры на уровне. Каждый объект попадает в `entities` и в группы отрисовки,
+    а группы правил уровня создаются через `group`, поэтому после игры арена знает всё, что нужно освободить.
+    `release` убирает из всех групп только живые объекты и возвращает их в пулы - за время,
+    пропорциональное их числу, а не числу созданных за игру объектов.
+    """
+
+    # Группы, в которые дополнительно попадает каждый объект, например группа для отрисовки
+    display_groups: Tuple[pygame.sprite.AbstractGroup, ...] = ()
+    entities: pygame.sprite.Group = field(init=False, default_factory=pygame.sprite.Group)
+    groups: List[pygame.sprite.Group] = field(init=False, default_factory=list)
+
+    def group(self) -> pygame.sprite.Group:
+        group = pygame.sprite.Group()
+        self.groups.append(group)
+        return group
+
+    def spawn(self, sprite_class, *groups, **kwargs):
+        """
+        Берет объект `sprite_class` из пула, если он пулится, иначе создает новый.
+        """
+
+        if hasattr(sprite_class, 'spawn'):
+            return sprite_class.spawn(self.entities, *self.display_groups, *groups, **kwargs)
+        return sprite_class(self.entities, *self.display_groups, *groups, **kwargs)
+
+    def release(self):
+        # `kill` убирает объект из всех его групп, а объекты из пулов возвращает в пул
+        for sprite in self.entities.sprites():
+            sprite.kill()
+
+        for group in self.groups:
+            group.empty()
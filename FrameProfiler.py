@@ -0,0 +1,178 @@
+import json
+import time
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import pygame
+
+# Фазы кадра в порядке выполнения. `wait` - ожидание следующего кадра, во время работы кадра оно не входит
+PHASES = ('events', 'update', 'collision', 'text', 'draw', 'flip', 'wait')
+
+
+class RingBuffer:
+    """
+    Последние `size` значений в заранее выделенном массиве: запись не выделяет память.
+    """
+
+    def __init__(self, size: int):
+        self.data = array('q', bytes(8 * size))
+        self.position = 0
+        self.count = 0
+
+    def append(self, value: int):
+        self.data[self.position] = value
+        self.position = (self.position + 1) % len(self.data)
+        self.count = min(self.count + 1, len(self.data))
+
+    def values(self) -> List[int]:
+        return list(self.data[:self.count])
+
+
+def percentile(ordered: List[int], share: float) -> int:
+    return ordered[min(int(share * len(ordered)), len(ordered) - 1)] if ordered else 0
+
+
+@dataclass
+class FrameProfiler:
+    """
+    Время фаз кадра по `time.perf_counter_ns`. Игровой цикл отмечает конец каждой фазы вызовом `mark`,
+    и время с предыдущей отметки прибавляется к этой фазе текущего кадра; в конце кадра суммы попадают
+    в кольцевые буферы последних `window` кадров. Пока замер выключен, `mark` сразу возвращается.
+    """
+
+    window: int = 600
+    enabled: bool = False
+    # Показывать ли поверх кадра окно со статистикой и как часто его обновлять (в кадрах)
+    overlay: bool = False
+    overlay_period: int = 15
+    # JSONL-файл, в который каждые `window` кадров дописывается статистика. None - не записывать
+    dump_path: str = None
+
+    buffers: Dict[str, RingBuffer] = field(init=False, default_factory=dict)
+    # Время фаз текущего кадра
+    current: Dict[str, int] = field(init=False, default_factory=dict)
+    last_mark: int = field(init=False, default=0)
+    frames: int = field(init=False, default=0)
+    entities: Dict[str, int] = field(init=False, default_factory=dict)
+
+    font: pygame.font.Font = field(init=False, default=None)
+    overlay_surface: pygame.Surface = field(init=False, default=None)
+    overlay_width: int = field(init=False, default=0)
+
+    def __post_init__(self):
+        self.buffers = {phase: RingBuffer(self.window) for phase in (*PHASES, 'frame')}
+        self.current = dict.fromkeys(PHASES, 0)
+        self.enabled = self.enabled or self.overlay or self.dump_path is not None
+
+    def toggle_overlay(self):
+        self.overlay = not self.overlay
+        self.overlay_surface = None
+        if self.overlay and not self.enabled:
+            self.enabled = True
+            self.begin_frame()
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+
+        for phase in PHASES:
+            self.current[phase] = 0
+        self.last_mark = time.perf_counter_ns()
+
+    def mark(self, phase: str):
+        if not self.enabled:
+            return
+
+        now = time.perf_counter_ns()
+        self.current[phase] += now - self.last_mark
+        self.last_mark = now
+
+    def end_frame(self, **entities: int):
+        """
+        Переносит время фаз кадра в буферы. `entities` - число объектов по группам на конец кадра.
+        """
+
+        if not self.enabled:
+            return
+
+        for phase, duration in self.current.items():
+            self.buffers[phase].append(duration)
+        self.buffers['frame'].append(sum(self.current.values()) - self.current['wait'])
+        self.entities = entities
+        self.frames += 1
+
+        if self.overlay and self.frames % self.overlay_period == 0:
+            self.overlay_surface = None
+        if self.dump_path is not None and self.frames % self.window == 0:
+            self.dump(self.dump_path)
+
+        self.begin_frame()
+
+    def stats(self) -> dict:
+        """
+        Среднее, p50 и p99 каждой фазы в микросекундах по последним `window` кадрам и частота кадров.
+        `frame` - время работы кадра без ожидания.
+        """
+
+        result = {}
+        for phase, buffer in self.buffers.items():
+            ordered = sorted(buffer.values())
+            result[phase] = {
+                'mean_us': round(sum(ordered) / len(ordered) / 1000, 1) if ordered else 0,
+                'p50_us': round(percentile(ordered, 0.5) / 1000, 1),
+                'p99_us': round(percentile(ordered, 0.99) / 1000, 1),
+            }
+
+        interval = sum(self.buffers['frame'].values()) + sum(self.buffers['wait'].values())
+        frames = self.buffers['frame'].count
+        result['fps'] = round(frames / interval * 1e9, 1) if interval else 0
+        result['entities'] = dict(self.entities)
+        return result
+
+    def dump(self, path: str, **extra):
+        """
+        Дописывает текущую статистику строкой JSON в `path`.
+        """
+
+        record = {'time': round(time.time(), 3), 'frames': self.frames, **extra, **self.stats()}
+        try:
+            with open(path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        except OSError:
+            pass
+
+    def draw_overlay(self, screen: pygame.Surface) -> pygame.Rect:
+        """
+        Рисует окно статистики в левом нижнем углу и возвращает его область.
+        Надписи пересобираются раз в `overlay_period` кадров, а в остальных кадрах окно выводится готовым.
+        """
+
+        if self.overlay_surface is None:
+            self.overlay_surface = self.render_overlay()
+
+        return screen.blit(self.overlay_surface, (0, screen.get_height() - self.overlay_surface.get_height()))
+
+    def render_overlay(self) -> pygame.Surface:
+        if self.font is None:
+            self.font = pygame.font.Font(None, 24)
+
+        stats = self.stats()
+        lines = [
+            f'FPS {stats["fps"]}  кадр p50 {stats["frame"]["p50_us"] / 1000:.2f} мс  '
+            f'p99 {stats["frame"]["p99_us"] / 1000:.2f} мс',
+            'p50 фаз, мс: ' + '  '.join(
+                f'{phase} {stats[phase]["p50_us"] / 1000:.2f}' for phase in PHASES if phase != 'wait'
+            ),
+            '  '.join(f'{group}: {count}' for group, count in stats['entities'].items()),
+        ]
+        rendered = [self.font.render(line, True, '#ffffff') for line in lines]
+
+        # Ширина окна не уменьшается, чтобы новое окно полностью закрывало предыдущее
+        width = max(self.overlay_width, *(text.get_width() + 16 for text in rendered))
+        self.overlay_width = width
+
+        surface = pygame.Surface((width, len(rendered) * 20 + 10))
+        surface.fill('#202020')
+        surface.blits([(text, (8, 6 + i * 20)) for i, text in enumerate(rendered)], doreturn=False)
+        return surface
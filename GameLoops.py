@@ -1,19 +1,18 @@
-import random
-import sqlite3
+import itertools
+import os
+import time
 from dataclasses import dataclass, field
 from typing import Any
 
 import pygame
 
+import Replay
+from Compositor import Compositor, ParallaxLayer, bake
+from FrameProfiler import FrameProfiler
+from Leaderboard import Leaderboard
 from StateMachine import GameState
-
-
-class CustomEvents:
-    DIFFICULTY_CHANGE = pygame.USEREVENT + 1
-    ADD_SCORE = pygame.USEREVENT + 2
-    OBSTACLE_SPAWN = pygame.USEREVENT + 3
-    BIRD_SPAWN = pygame.USEREVENT + 4
-    ENEMY_SPAWN = pygame.USEREVENT + 5
+from TextCache import TextCache
+from Viewport import Viewport
 
 
 @dataclass
@@ -21,6 +20,8 @@ class GameLoop:
     game: Any
     initialized: bool = field(init=False, default=False)
     linked_game_state: GameState = field(init=False, default=None)
+    # Статичный экран перерисовывается только при поступлении ввода
+    static_screen: bool = field(init=False, default=False)
     presets: dict = field(init=False, default_factory=dict)
 
     def reset(self):
@@ -45,18 +46,21 @@ class GameLoop:
         Обрабатывает одиночный ивент.
         """
 
-    def loop(self):
+    def loop(self, events):
         if not self.initialized:
             self.start()
             self.initialized = True
 
-        for event in pygame.event.get():
+        for event in events:
             if event.type == pygame.QUIT:
                 self.set_state(GameState.QUITTING)
 
             self.handle_event(event)
+        self.profiler.mark('events')
 
         self.update()
+        # Время, которое уровень не отметил сам, относится к обновлению
+        self.profiler.mark('update')
 
     # Методы для удобства
     def set_state(self, new_state: GameState, **kwargs):
@@ -75,44 +79,243 @@ class GameLoop:
         return self.game.pause_menu
 
     @property
-    def obstacle_sprites(self) -> pygame.sprite.Group:
-        return self.game.obstacle_sprites
+    def width(self) -> int:
+        return self.game.width
 
     @property
-    def enemies_sprites(self) -> pygame.sprite.Group:
-        return self.game.enemies_sprites
+    def height(self) -> int:
+        return self.game.height
 
     @property
-    def birds_sprites(self) -> pygame.sprite.Group:
-        return self.game.birds_sprites
+    def screen(self) -> pygame.Surface:
+        return self.game.screen
 
     @property
-    def bullet_booster_sprites(self) -> pygame.sprite.Group:
-        return self.game.bullet_booster_sprites
+    def clock(self) -> pygame.time.Clock:
+        return self.game.clock
 
     @property
-    def health_booster_sprites(self) -> pygame.sprite.Group:
-        return self.game.health_booster_sprites
+    def text_cache(self) -> TextCache:
+        return self.game.text_cache
 
     @property
-    def width(self) -> int:
-        return self.game.width
+    def leaderboard(self) -> Leaderboard:
+        return self.game.leaderboard
 
     @property
-    def height(self) -> int:
-        return self.game.height
+    def profiler(self) -> FrameProfiler:
+        return self.game.profiler
 
     @property
-    def screen(self) -> pygame.Surface:
-        return self.game.screen
+    def viewport(self) -> Viewport:
+        return self.game.viewport
+
+    def mouse_pos(self):
+        # Положение мыши приходит в размере кадра, а кнопки расставлены в игровых координатах
+        return self.viewport.to_logical(pygame.mouse.get_pos())
+
+
+class LevelLoop(GameLoop):
+    """
+    Общая часть игровых уровней: фон с землей, продвижение симуляции и отрисовка кадра.
+    Симуляция идет шагами постоянной длины `1 / TICKS_PER_SECOND` секунды: за кадр выполняется столько шагов,
+    сколько их уместилось в прошедшее время, поэтому скорость игры не зависит от частоты кадров.
+    Объекты уровня рисуются между положениями до и после последнего шага, пропорционально остатку времени.
+    Кадр собирает `Compositor`: небо с землей - готовый фон, интерфейс пересобирается только при изменении
+    `hud_state`, а каждый кадр рисуются лишь объекты симуляции и, если в игре включен `parallax`, плывущие облака.
+    Если в игре включен `dirty_rects`, на экран выводятся только изменившиеся области, иначе кадр каждый раз
+    выводится целиком.
+    """
+
+    # Больше шагов за кадр не выполняется, чтобы долгий кадр не тянул за собой еще более долгие
+    max_steps_per_frame = 5
+    sky_color = "#88b0ed"
+    # Высота полосы облаков и скорость, с которой она плывет, в пикселях за шаг
+    clouds_y = 40
+    clouds_speed = 0.5
 
-    @property
-    def clock(self) -> pygame.time.Clock:
-        return self.game.clock
+    def __init__(self, game):
+        super().__init__(game)
+        self.compositor = None
+        self.simulation = None
+        # Запись ввода текущей игры на уровне
+        self.replay = None
+        # Время, которое еще не превращено в шаги симуляции, и момент последнего отсчета
+        self.accumulator = 0.0
+        self.last_time = 0.0
+
+    def start_rendering(self):
+        # Фон от игры к игре не меняется, поэтому собирается один раз
+        if self.compositor is None:
+            from Sprites import CloudsSprite, GroundSprite
+            ground = self.viewport.blits([(GroundSprite.image, (0, 550))])
+            layers = []
+            if self.game.parallax:
+                # Облака висят над небом, поэтому полоса сразу собирается на его цвете
+                layers.append(ParallaxLayer.from_image(
+                    self.viewport.image(CloudsSprite.image), self.screen.get_width(),
+                    self.viewport.point((0, self.clouds_y))[1], self.clouds_speed * self.viewport.scale_x,
+                    background=self.sky_color,
+                ))
+            self.compositor = Compositor(bake(self.screen.get_size(), ground, self.sky_color), layers)
+
+        self.compositor.invalidate()
+
+        # Время, проведенное в паузе или в другом экране, в шаги не превращается
+        self.accumulator = 0.0
+        self.last_time = time.perf_counter()
+
+    def start_simulation(self, simulation):
+        """
+        Начинает новую игру на уровне. Прошлая игра, если она была, освобождается.
+        """
+
+        self.end_session()
+        self.simulation = simulation
+        self.simulation.profiler = self.profiler
+        self.replay = Replay.Replay(simulation.level, simulation.seed)
+
+    def end_session(self):
+        """
+        Освобождает игру на уровне: ее события отменяются, а объекты возвращаются в пулы.
+        Вызывается, когда игра больше не будет ни продолжена, ни показана, - при новой игре и при выходе в меню.
+        """
+
+        if self.simulation is None:
+            return
+
+        self.simulation.release()
+        self.simulation = None
+        self.replay = None
+
+    def send_input(self, code: int):
+        """
+        Передает действие игрока симуляции и записывает его вместе с номером текущего шага.
+        """
+
+        self.replay.record(self.simulation.tick, code)
+        Replay.apply_input(self.simulation, code)
+
+    def finish_simulation(self):
+        """
+        Завершает игру на уровне. Если в игре задан `replays_dir`, запись ввода сохраняется туда.
+        """
+
+        self.simulation.stop()
+        self.replay.finish(self.simulation.tick, self.simulation.score)
+
+        if self.game.replays_dir is None:
+            return
+
+        # Игры, закончившиеся в одну секунду, различаются по seed, а если совпал и он - по номеру в конце имени
+        stem = f'{self.simulation.level}_{time.strftime("%Y%m%d_%H%M%S")}_{self.simulation.seed:08x}'
+        try:
+            os.makedirs(self.game.replays_dir, exist_ok=True)
+            for attempt in itertools.count():
+                name = f'{stem}_{attempt}.replay' if attempt else f'{stem}.replay'
+                try:
+                    self.replay.save(os.path.join(self.game.replays_dir, name), mode='xb')
+                    break
+                except FileExistsError:
+                    continue
+        except OSError as error:
+            print(f'Не удалось сохранить запись игры: {error}')
+
+    def advance(self) -> int:
+        """
+        Выполняет шаги симуляции за время, прошедшее с прошлого кадра, и возвращает их число.
+        """
+
+        from Sprites import TICKS_PER_SECOND
+        step_time = 1 / TICKS_PER_SECOND
+
+        now = time.perf_counter()
+        self.accumulator += now - self.last_time
+        self.last_time = now
+
+        steps = 0
+        while self.accumulator >= step_time and not self.simulation.game_over:
+            if steps == self.max_steps_per_frame:
+                # Игра не успевает за реальным временем: лишнее время отбрасывается, и игра замедляется
+                self.accumulator = 0.0
+                break
+
+            self.simulation.step()
+            self.accumulator -= step_time
+            steps += 1
+
+        return steps
+
+    def step_fraction(self) -> float:
+        """
+        Доля следующего шага, которая уже прошла: кадр показывает мир между последними двумя шагами в этой доле.
+        """
+
+        from Sprites import TICKS_PER_SECOND
+        return min(self.accumulator * TICKS_PER_SECOND, 1.0)
+
+    def sprite_blits(self) -> list:
+        """
+        Возвращает спрайты в виде пар (картинка, позиция) для `Surface.blits`.
+        Объекты симуляции стоят между положениями до и после последнего шага.
+        """
+
+        alpha = self.step_fraction()
+        previous_positions = self.simulation.previous_positions
+
+        blits = []
+        for sprite in self.all_sprites:
+            x, y = sprite.rect.topleft
+            previous = previous_positions.get(sprite)
+            if previous is not None:
+                x = round(previous[0] + (x - previous[0]) * alpha)
+                y = round(previous[1] + (y - previous[1]) * alpha)
+            blits.append((sprite.image, (x, y)))
+
+        return blits
+
+    def hud_state(self) -> tuple:
+        """
+        Значения, от которых зависит интерфейс. Интерфейс пересобирается, только когда они меняются.
+        """
+
+        return ()
+
+    def hud(self) -> list:
+        """
+        Возвращает иконки и надписи интерфейса в виде пар (поверхность, позиция) для `Surface.blits`.
+        """
+
+        return []
+
+    def compose(self, dirty=False):
+        """
+        Собирает кадр уровня на `screen`, не выводя его на экран. Возвращает области, изменившиеся в режиме `dirty`,
+        или None, если кадр нарисован целиком.
+        """
+
+        self.compositor.set_hud(self.hud_state(), lambda: self.viewport.blits(self.hud()))
+        self.profiler.mark('text')
+
+        sprites = self.viewport.blits(self.sprite_blits())
+        # Облака стоят там же, где и объекты, - между последними двумя шагами
+        scroll = self.simulation.tick - 1 + self.step_fraction()
+        return self.compositor.draw(self.screen, sprites, scroll, dirty=dirty)
+
+    def draw(self):
+        rects = self.compose(self.game.dirty_rects)
+        self.profiler.mark('draw')
+
+        if rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
+        self.profiler.mark('flip')
 
 
 class MainMenuLoop(GameLoop):
     linked_game_state = GameState.MAIN_MENU
+    static_screen = True
 
     def __init__(self, game):
         super().__init__(game)
@@ -120,8 +323,14 @@ class MainMenuLoop(GameLoop):
         self.bird_mode_btn = None
         self.records_btn = None
         self.exit_menu_btn = None
+        self.compositor = None
 
     def start(self):
+        # Игры, из которых вышли в меню, больше не понадобятся
+        for game_loop in self.game.game_loops:
+            if isinstance(game_loop, LevelLoop):
+                game_loop.end_session()
+
         import Sprites
         self.all_sprites.empty()
         Sprites.MainMenuBackground(self.all_sprites)
@@ -135,13 +344,20 @@ class MainMenuLoop(GameLoop):
         self.records_btn = Sprites.RecordsButton(self.all_sprites, x=370, y=490)
         self.exit_menu_btn = Sprites.ExitMenuButton(self.all_sprites, x=370, y=610)
 
+        # Меню неподвижно, поэтому все его спрайты собираются в один фон при первом показе
+        if self.compositor is None:
+            sprites = self.viewport.blits([(sprite.image, sprite.rect.topleft) for sprite in self.all_sprites])
+            self.compositor = Compositor(bake(self.screen.get_size(), sprites))
+
     def update(self):
-        self.all_sprites.draw(self.screen)
+        self.compositor.draw(self.screen, [])
+        self.profiler.mark('draw')
         pygame.display.flip()
+        self.profiler.mark('flip')
 
     def handle_event(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-            mouse_pos = pygame.mouse.get_pos()
+            mouse_pos = self.mouse_pos()
 
             if self.play_btn.rect.collidepoint(mouse_pos):
                 self.set_state(GameState.MAIN_LEVEL_PLAYING)
@@ -156,153 +372,68 @@ class MainMenuLoop(GameLoop):
                 self.set_state(GameState.QUITTING)
 
 
-class MainGameLoop(GameLoop):
+class MainGameLoop(LevelLoop):
     linked_game_state = GameState.MAIN_LEVEL_PLAYING
 
     def __init__(self, game):
         super().__init__(game)
-        self.difficulty = 0
-        self.health = 0
-        self.score = 0
-        self.bullets = 0
-        self.player = None
-        self.heart_sprites = None
         self.font = None
-        self.score_sprite = None
 
     def start(self):
-        pygame.time.set_timer(CustomEvents.OBSTACLE_SPAWN, 1000)
-        pygame.time.set_timer(CustomEvents.BIRD_SPAWN, 1500)
-        pygame.time.set_timer(CustomEvents.DIFFICULTY_CHANGE, 5000)
-        pygame.time.set_timer(CustomEvents.ADD_SCORE, 1500)
+        self.start_rendering()
 
         if self.presets:
-            self.all_sprites.add(self.presets['all_sprites'])
-            self.obstacle_sprites.add(self.presets['obstacle_sprites'])
-            self.birds_sprites.add(self.presets['birds_sprites'])
-            self.bullet_booster_sprites.add(self.presets['bullet_booster_sprites'])
-            self.health_booster_sprites.add(self.presets['health_booster_sprites'])
-
-            self.difficulty = self.presets['difficulty']
-            self.health = self.presets['health']
-            self.score = self.presets['score']
-            self.bullets = self.presets['bullets']
-            self.player = self.presets['player']
-
             return
 
-        self.difficulty = 20
-        self.health = 3
-        self.score = 0
-        self.bullets = 5
-        self.font = pygame.font.Font(None, 70)
+        if self.font is None:
+            self.font = pygame.font.Font(None, 70)
 
         self.all_sprites.empty()
-        from Sprites import GroundSprite, AnimatedPlayerSprite, HeartSprite, ScoreSprite, BulletIcon
-        GroundSprite(self.all_sprites, x=0, y=550)
-        BulletIcon(self.all_sprites, x=400, y=15)
-        self.score_sprite = ScoreSprite(self.all_sprites, x=self.width - 100, y=10)
-        self.player = AnimatedPlayerSprite(self.all_sprites, x=100, y=320)
-        self.heart_sprites = [HeartSprite(self.all_sprites, x=20 + i * 100, y=10) for i in range(self.health)]
+        from Simulation import MainLevelSimulation
+        self.start_simulation(MainLevelSimulation(self.all_sprites, width=self.width))
+
+    def hud_state(self):
+        return self.simulation.score, self.simulation.bullets, max(self.simulation.health, 0)
+
+    def hud(self):
+        from Sprites import HeartSprite, ScoreSprite, BulletIcon
+        score, bullets, health = self.hud_state()
+        score_text = self.text_cache.render(self.font, f'{score}', '#ffe7bd')
+        bullets_text = self.text_cache.render(self.font, f'{bullets}', '#ffe7bd')
+
+        return [
+            *((HeartSprite.image, (20 + i * 100, 10)) for i in range(health)),
+            (BulletIcon.image, (400, 15)),
+            (bullets_text, (470, 25)),
+            (ScoreSprite.image, (self.width - score_text.get_width() - 100, 10)),
+            (score_text, (self.width - score_text.get_width() - 20, 20)),
+        ]
 
     def update(self):
-        self.screen.fill("#88b0ed")
-        self.all_sprites.update()
-
-        score_text = self.font.render(f'{self.score}', True, '#ffe7bd')
-        self.screen.blit(score_text, (self.width - score_text.get_width() - 20, 20))
-        self.score_sprite.move(self.width, score_text.get_width())
-
-        bullets_text = self.font.render(f'{self.bullets}', True, '#ffe7bd')
-        self.screen.blit(bullets_text, (470, 25))
+        self.advance()
 
-        if pygame.sprite.spritecollide(self.player, self.obstacle_sprites, True, pygame.sprite.collide_mask):
-            self.health -= 1
-            self.heart_sprites.pop().kill()
+        if self.simulation.game_over:
+            self.finish_simulation()
+            self.set_state(GameState.GAME_OVER, score=self.simulation.score, level='main')
+            self.leaderboard.add_score('main', self.simulation.score)
 
-            if self.health == 0:
-                self.set_state(GameState.GAME_OVER, score=self.score, level='main')
-
-                connection = sqlite3.connect('leaderboard.sqlite')
-                cursor = connection.cursor()
-                cursor.execute('INSERT INTO main_level VALUES (?)', (self.score,))
-                connection.commit()
-                connection.close()
-
-        if pygame.sprite.spritecollide(self.player, self.bullet_booster_sprites, True, pygame.sprite.collide_mask):
-            self.bullets += 1
-
-        if pygame.sprite.spritecollide(self.player, self.health_booster_sprites, True, pygame.sprite.collide_mask):
-            self.health = min(self.health + 1, 3)
-            if len(self.heart_sprites) < self.health:
-                from Sprites import HeartSprite
-                self.heart_sprites = [HeartSprite(self.all_sprites, x=20 + i * 100, y=10) for i in range(self.health)]
-
-        self.all_sprites.draw(self.screen)
-
-        pygame.display.flip()
-        self.clock.tick(60)
+        self.draw()
 
     def handle_event(self, event: pygame.event.Event):
         if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
-            self.player.jump()
+            self.send_input(Replay.JUMP)
 
-        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and self.bullets > 0:
-            self.bullets -= 1
-            from Sprites import BulletSprite
-            BulletSprite(
-                self.all_sprites,
-                x=self.player.rect.centerx + 80, y=self.player.rect.centery - 23,
-                birds_sprite_group=self.birds_sprites
-            )
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            self.send_input(Replay.FIRE)
 
         elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
-            self.set_state(GameState.PAUSE_MENU, all_sprites=self.all_sprites, obstacle_sprites=self.obstacle_sprites,
-                           birds_sprites=self.birds_sprites, bullet_booster_sprites=self.bullet_booster_sprites,
-                           health_booster_sprites=self.health_booster_sprites, health=self.health, score=self.score,
-                           bullets=self.bullets, difficulty=self.difficulty, player=self.player, level='main')
-
-        elif event.type == CustomEvents.OBSTACLE_SPAWN:
-            if random.randint(0, 100) <= 10:
-                from Sprites import BulletBoosterSprite
-                BulletBoosterSprite(
-                    self.all_sprites, self.bullet_booster_sprites,
-                    x=self.width, y=540,
-                    move_speed=max(self.difficulty // 10, 5)
-                )
-            elif random.randint(0, 100) <= 1:
-                from Sprites import HealthBoosterSprite
-                HealthBoosterSprite(
-                    self.all_sprites, self.health_booster_sprites,
-                    x=self.width, y=510,
-                    move_speed=max(self.difficulty // 10, 5)
-                )
-            elif random.randint(0, 100) < self.difficulty:
-                from Sprites import ObstacleSprite
-                ObstacleSprite(
-                    self.all_sprites, self.obstacle_sprites,
-                    x=self.width, y=515,
-                    move_speed=max(self.difficulty // 10, 5)
-                )
-
-        elif event.type == CustomEvents.BIRD_SPAWN:
-            if random.randint(0, 100) < self.difficulty:
-                from Sprites import MovingBirdSprite
-                MovingBirdSprite(
-                    self.all_sprites, self.obstacle_sprites, self.birds_sprites,
-                    x=self.width, y=150,
-                    move_speed=max(self.difficulty // 10, 5)
-                )
-
-        elif event.type == CustomEvents.DIFFICULTY_CHANGE:
-            self.difficulty = min(self.difficulty + 1, 100)
-
-        elif event.type == CustomEvents.ADD_SCORE:
-            self.score += 1
+            self.send_input(Replay.PAUSE)
+            self.set_state(GameState.PAUSE_MENU, level='main')
 
 
 class GameOver(GameLoop):
     linked_game_state = GameState.GAME_OVER
+    static_screen = True
 
     def __init__(self, game):
         super().__init__(game)
@@ -320,18 +451,21 @@ class GameOver(GameLoop):
         self.restart_btn = Sprites.RestartButton(self.all_sprites, x=670, y=300)
         self.main_menu_btn = Sprites.ReturnToMainMenuButton(self.all_sprites, x=270, y=300)
 
-        self.all_sprites.draw(self.screen)
-
-        self.font = pygame.font.Font(None, 70)
-        score_text = self.font.render(f'{self.presets["score"]}', True, '#086972')
-        self.screen.blit(score_text, (800, 198))
+        if self.font is None:
+            self.font = pygame.font.Font(None, 70)
+        score_text = self.text_cache.render(self.font, f'{self.presets["score"]}', '#086972')
+        self.screen.blits(self.viewport.blits([
+            *((sprite.image, sprite.rect.topleft) for sprite in self.all_sprites),
+            (score_text, (800, 198)),
+        ]), doreturn=False)
 
     def update(self):
         pygame.display.flip()
+        self.profiler.mark('flip')
 
     def handle_event(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-            mouse_pos = pygame.mouse.get_pos()
+            mouse_pos = self.mouse_pos()
 
             if self.restart_btn.rect.collidepoint(mouse_pos):
                 if self.presets['level'] == 'main':
@@ -344,207 +478,194 @@ class GameOver(GameLoop):
 
 
 class PauseMenu(GameLoop):
+    """
+    Пауза ничего не копирует и не передает: симуляция уровня просто не получает шагов, пока открыт этот экран,
+    и продолжается с того же места. Последний кадр уровня вместе с затемнением и меню паузы собирается
+    в одну поверхность при входе в паузу, поэтому экран паузы - это один `blit`, и только когда его нужно
+    вывести заново: при входе в паузу, после того, как окно было перекрыто, и при переключении окна статистики.
+    """
+
     linked_game_state = GameState.PAUSE_MENU
+    static_screen = True
 
     def __init__(self, game):
         super().__init__(game)
         self.continuation_btn = None
         self.main_menu_btn = None
+        self.paused_frame = None
+        self.redraw = False
 
     def start(self):
-        import Sprites
-        Sprites.PauseDarkBackground(self.pause_menu)
-        Sprites.PauseBackground(self.pause_menu, x=240, y=60)
-
-        self.continuation_btn = Sprites.ContinuationButton(self.pause_menu, x=670, y=180)
-        self.main_menu_btn = Sprites.ReturnToMainMenuButton(self.pause_menu, x=270, y=180)
+        # Меню паузы одно и то же при каждой паузе, поэтому его спрайты создаются один раз
+        if not self.pause_menu:
+            import Sprites
+            Sprites.PauseDarkBackground(self.pause_menu)
+            Sprites.PauseBackground(self.pause_menu, x=240, y=60)
+
+            self.continuation_btn = Sprites.ContinuationButton(self.pause_menu, x=670, y=180)
+            self.main_menu_btn = Sprites.ReturnToMainMenuButton(self.pause_menu, x=270, y=180)
+
+        # Последний кадр уровня собирается заново, а не копируется с экрана: поверх экрана может быть
+        # окно статистики кадров, которое не должно застыть в кадре паузы
+        self.level_loop().compose()
+        self.paused_frame = self.screen.copy()
+        menu = self.viewport.blits([(sprite.image, sprite.rect.topleft) for sprite in self.pause_menu])
+        self.paused_frame.blits(menu, doreturn=False)
+        self.redraw = True
 
     def update(self):
-        self.all_sprites.draw(self.screen)
-        self.pause_menu.draw(self.screen)
+        if not self.redraw:
+            return
+
+        self.screen.blit(self.paused_frame, (0, 0))
+        self.profiler.mark('draw')
         pygame.display.flip()
+        self.profiler.mark('flip')
+        self.redraw = False
 
     def handle_event(self, event):
-        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-            mouse_pos = pygame.mouse.get_pos()
+        # F3 включает и выключает окно статистики кадров, и без него экран паузы нужно вывести заново
+        if event.type == pygame.WINDOWEXPOSED or event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            self.redraw = True
+
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+            self.resume()
 
-            if (self.continuation_btn.rect.collidepoint(mouse_pos) or
-                    event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            mouse_pos = self.mouse_pos()
 
-                if self.presets['level'] == 'main':
-                    self.set_state(GameState.MAIN_LEVEL_PLAYING, **self.presets)
-                else:
-                    self.set_state(GameState.IM_A_BIRD_LEVEL_PLAYING, **self.presets)
+            if self.continuation_btn.rect.collidepoint(mouse_pos):
+                self.resume()
 
             elif self.main_menu_btn.rect.collidepoint(mouse_pos):
                 self.set_state(GameState.MAIN_MENU)
 
+    def level_state(self) -> GameState:
+        return GameState.MAIN_LEVEL_PLAYING if self.presets['level'] == 'main' else GameState.IM_A_BIRD_LEVEL_PLAYING
+
+    def level_loop(self) -> LevelLoop:
+        return self.game.loops_by_state[self.level_state()]
 
-class ImABirdLevelLoop(GameLoop):
+    def resume(self):
+        self.set_state(self.level_state(), **self.presets)
+
+
+class ImABirdLevelLoop(LevelLoop):
     linked_game_state = GameState.IM_A_BIRD_LEVEL_PLAYING
 
     def __init__(self, game):
         super().__init__(game)
-        self.difficulty = 0
-        self.score = 0
-        self.player = None
-        self.heart_sprite = None
         self.font = None
-        self.score_sprite = None
-        self.enemies = None
-        self.pressed_key = None
 
     def start(self):
-        pygame.time.set_timer(CustomEvents.ENEMY_SPAWN, 1500)
-        pygame.time.set_timer(CustomEvents.DIFFICULTY_CHANGE, 5000)
+        self.start_rendering()
 
         if self.presets:
-            self.all_sprites.add(self.presets['all_sprites'])
-            self.enemies_sprites.add(self.presets['enemies_sprites'])
-
-            self.difficulty = self.presets['difficulty']
-            self.score = self.presets['score']
-            self.player = self.presets['player']
-
             return
 
-        self.difficulty = 20
-        self.score = 0
-        self.pressed_key = None
-        self.font = pygame.font.Font(None, 70)
+        if self.font is None:
+            self.font = pygame.font.Font(None, 70)
 
         self.all_sprites.empty()
-        from Sprites import GroundSprite, HeartSprite, ScoreSprite, PlayableBird
-        GroundSprite(self.all_sprites, x=0, y=550)
-        self.score_sprite = ScoreSprite(self.all_sprites, x=self.width - 100, y=10)
-        self.player = PlayableBird(self.all_sprites, x=100, y=220)
-        self.heart_sprite = HeartSprite(self.all_sprites, x=20, y=10)
-
-    def update(self):
-        self.screen.fill("#88b0ed")
-        self.all_sprites.update()
-
-        score_text = self.font.render(f'{self.score}', True, '#ffe7bd')
-        self.screen.blit(score_text, (self.width - score_text.get_width() - 20, 20))
-        self.score_sprite.move(self.width, score_text.get_width())
+        from Simulation import ImABirdLevelSimulation
+        self.start_simulation(ImABirdLevelSimulation(self.all_sprites, width=self.width))
 
-        if self.pressed_key == pygame.K_UP:
-            self.player.up()
-        elif self.pressed_key == pygame.K_DOWN:
-            self.player.down()
+    def hud_state(self):
+        return self.simulation.score, self.simulation.game_over
 
-        if pygame.sprite.spritecollide(self.player, self.obstacle_sprites, True, pygame.sprite.collide_mask):
-            self.heart_sprite.kill()
+    def hud(self):
+        from Sprites import HeartSprite, ScoreSprite
+        score_text = self.text_cache.render(self.font, f'{self.simulation.score}', '#ffe7bd')
 
-            connection = sqlite3.connect('leaderboard.sqlite')
-            cursor = connection.cursor()
-            cursor.execute('INSERT INTO im_a_bird_level VALUES (?)', (self.score,))
-            connection.commit()
-            connection.close()
+        # Единственное сердце пропадает вместе с проигрышем
+        heart = [] if self.simulation.game_over else [(HeartSprite.image, (20, 10))]
+        return [
+            *heart,
+            (ScoreSprite.image, (self.width - score_text.get_width() - 100, 10)),
+            (score_text, (self.width - score_text.get_width() - 20, 20)),
+        ]
 
-            self.set_state(GameState.GAME_OVER, score=self.score, level='bird')
+    def update(self):
+        self.advance()
 
-        if pygame.sprite.spritecollide(self.player, self.enemies_sprites, True, pygame.sprite.collide_mask):
-            self.score += 1
+        if self.simulation.game_over:
+            self.finish_simulation()
+            self.leaderboard.add_score('bird', self.simulation.score)
+            self.set_state(GameState.GAME_OVER, score=self.simulation.score, level='bird')
 
-        self.all_sprites.draw(self.screen)
-        pygame.display.flip()
-        self.clock.tick(60)
+        self.draw()
 
     def handle_event(self, event: pygame.event.Event):
-        if event.type == pygame.KEYDOWN and event.key in (pygame.K_UP, pygame.K_DOWN):
-            self.pressed_key = event.key
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_UP:
+            self.send_input(Replay.UP)
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_DOWN:
+            self.send_input(Replay.DOWN)
         elif event.type == pygame.KEYUP and event.key in (pygame.K_UP, pygame.K_DOWN):
-            self.pressed_key = None
+            self.send_input(Replay.RELEASE)
 
         elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
-            self.set_state(GameState.PAUSE_MENU, all_sprites=self.all_sprites, enemies_sprites=self.enemies_sprites,
-                           score=self.score, difficulty=self.difficulty, player=self.player, level='bird')
-
-        if event.type == CustomEvents.ENEMY_SPAWN:
-            if random.randint(0, 100) < self.difficulty:
-                from Sprites import EnemySprite, EnemyBulletSprite
-                EnemySprite(
-                    self.all_sprites, self.enemies_sprites,
-                    x=self.width, y=320,
-                    move_speed=max(self.difficulty // 10, 5),
-                )
-                EnemyBulletSprite(
-                    self.all_sprites, self.obstacle_sprites,
-                    x=self.width, y=420,
-                )
-            elif random.randint(0, 100) < self.difficulty:
-                from Sprites import EnemyOnPlaneSprite, EnemyBulletSprite
-                EnemyOnPlaneSprite(
-                    self.all_sprites, self.enemies_sprites,
-                    x=self.width, y=100,
-                    move_speed=max(self.difficulty // 10, 5),
-                )
-                EnemyBulletSprite(
-                    self.all_sprites, self.obstacle_sprites,
-                    x=self.width, y=180,
-                )
-
-        elif event.type == CustomEvents.DIFFICULTY_CHANGE:
-            self.difficulty = min(self.difficulty + 1, 100)
+            self.send_input(Replay.PAUSE)
+            self.set_state(GameState.PAUSE_MENU, level='bird')
 
 
 class RecordsTableLoop(GameLoop):
     linked_game_state = GameState.RECORDS_TABLE_MENU
+    static_screen = True
 
     def __init__(self, game):
         super().__init__(game)
         self.font = None
+        self.small_font = None
+        # Готовый экран таблицы и версия таблицы рекордов, по которой он собран
+        self.table_surface = None
+        self.table_version = None
 
     def start(self):
-        self.screen.fill('white')
-
-        self.all_sprites.empty()
-        from Sprites import MainMenuBackground
-        MainMenuBackground(self.all_sprites)
+        if self.table_surface is None or self.table_version != self.leaderboard.version:
+            self.table_surface = self.render_table()
+            self.table_version = self.leaderboard.version
 
-        self.all_sprites.draw(self.screen)
+        self.screen.blit(self.table_surface, (0, 0))
+        pygame.display.flip()
 
-        self.font = pygame.font.Font(None, 70)
+    def render_table(self) -> pygame.Surface:
+        """
+        Собирает экран таблицы рекордов в отдельную поверхность. Все надписи выводятся одним `Surface.blits`.
+        """
 
-        text = self.font.render('Ваши наилучшие результаты', True, '#086972')
-        self.screen.blit(text, ((self.width - text.get_width()) // 2, 20))
+        if self.font is None:
+            self.font = pygame.font.Font(None, 70)
+            self.small_font = pygame.font.Font(None, 50)
 
-        text = self.font.render('Основной уровень', True, '#086972')
-        self.screen.blit(text, (100, 100))
+        from Sprites import MainMenuBackground
+        background = MainMenuBackground()
 
-        text = self.font.render('Я - птица', True, '#086972')
-        self.screen.blit(text, (830, 100))
+        title = self.font.render('Ваши наилучшие результаты', True, '#086972')
+        lines = [
+            (title, ((self.width - title.get_width()) // 2, 20)),
+            (self.font.render('Основной уровень', True, '#086972'), (100, 100)),
+            (self.font.render('Я - птица', True, '#086972'), (830, 100)),
+        ]
 
-        connection = sqlite3.connect('leaderboard.sqlite')
-        cursor = connection.cursor()
-        main_level_records = cursor.execute('SELECT score FROM main_level ORDER BY score DESC').fetchmany(8)
-        im_a_bird_level_records = cursor.execute('SELECT score FROM im_a_bird_level ORDER BY score DESC').fetchmany(8)
-        connection.close()
+        main_level_records = self.leaderboard.top_scores('main')
+        im_a_bird_level_records = self.leaderboard.top_scores('bird')
 
         if not main_level_records:
-            small_font = pygame.font.Font(None, 50)
-            text = small_font.render('Результатов пока нет...', True, '#086972')
-            self.screen.blit(text, (130, 230))
-            text = small_font.render('Никогда не поздно исправить!', True, '#086972')
-            self.screen.blit(text, (50, 300))
+            lines.append((self.small_font.render('Результатов пока нет...', True, '#086972'), (130, 230)))
+            lines.append((self.small_font.render('Никогда не поздно исправить!', True, '#086972'), (50, 300)))
 
         for i, score in enumerate(main_level_records, 1):
-            text = self.font.render(f'{i}. {score[0]}', True, '#086972')
-            self.screen.blit(text, (240, 130 + i * 60))
+            lines.append((self.font.render(f'{i}. {score}', True, '#086972'), (240, 130 + i * 60)))
 
         if not im_a_bird_level_records:
-            small_font = pygame.font.Font(None, 50)
-            text = small_font.render('Результатов пока нет...', True, '#086972')
-            self.screen.blit(text, (750, 230))
-            text = small_font.render('Никогда не поздно исправить!', True, '#086972')
-            self.screen.blit(text, (680, 300))
+            lines.append((self.small_font.render('Результатов пока нет...', True, '#086972'), (750, 230)))
+            lines.append((self.small_font.render('Никогда не поздно исправить!', True, '#086972'), (680, 300)))
 
         for i, score in enumerate(im_a_bird_level_records, 1):
-            text = self.font.render(f'{i}. {score[0]}', True, '#086972')
-            self.screen.blit(text, (870, 130 + i * 60))
+            lines.append((self.font.render(f'{i}. {score}', True, '#086972'), (870, 130 + i * 60)))
 
-        pygame.display.flip()
+        lines.insert(0, (background.image, background.rect.topleft))
+        return bake(self.screen.get_size(), self.viewport.blits(lines))
 
     def handle_event(self, event):
         if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
@@ -0,0 +1,143 @@
+import sqlite3
+import threading
+from contextlib import suppress
+from dataclasses import dataclass, field
+from queue import Queue, Empty
+from typing import Dict, List
+
+# Таблицы результатов для каждого уровня
+LEVEL_TABLES = {
+    'main': 'main_level',
+    'bird': 'im_a_bird_level',
+}
+
+
+@dataclass
+class Leaderboard:
+    """
+    Таблица рекордов. Держит одно соединение с базой в режиме WAL, а новые результаты
+    записывает пачками в фоновом потоке, чтобы запись на диск не задерживала кадр.
+    Лучшие результаты каждого уровня хранятся в памяти и обновляются при добавлении нового результата,
+    так что для их показа база не нужна.
+    """
+
+    path: str = 'leaderboard.sqlite'
+    top_size: int = 8
+    # Через сколько секунд повторить запись, если база занята или запись не удалась,
+    # и сколько раз повторить ее при закрытии, прежде чем отказаться от оставшихся результатов
+    retry_delay: float = 1.0
+    close_attempts: int = 1
+    connection: sqlite3.Connection = field(init=False, default=None)
+    lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+    scores_queue: Queue = field(init=False, default_factory=Queue)
+    writer: threading.Thread = field(init=False, default=None)
+    best_scores: Dict[str, List[int]] = field(init=False, default_factory=dict)
+    # Увеличивается при каждом новом результате, чтобы экраны могли сбрасывать свои кэши
+    version: int = field(init=False, default=0)
+
+    def open(self):
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+
+        for table in LEVEL_TABLES.values():
+            self.connection.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                score INTEGER
+            )""")
+            self.connection.execute(f'CREATE INDEX IF NOT EXISTS {table}_score ON {table} (score DESC)')
+
+        self.connection.commit()
+
+        for level, table in LEVEL_TABLES.items():
+            rows = self.connection.execute(f'SELECT score FROM {table} ORDER BY score DESC LIMIT ?', (self.top_size,))
+            self.best_scores[level] = [score for score, in rows]
+
+        self.writer = threading.Thread(target=self.write_scores, name='leaderboard-writer', daemon=True)
+        self.writer.start()
+
+    def add_score(self, level: str, score: int):
+        """
+        Обновляет лучшие результаты уровня в памяти и ставит результат в очередь на запись.
+        """
+
+        self.scores_queue.put((LEVEL_TABLES[level], score))
+        self.version += 1
+
+        best_scores = self.best_scores[level]
+        best_scores.append(score)
+        best_scores.sort(reverse=True)
+        del best_scores[self.top_size:]
+
+    def top_scores(self, level: str) -> List[int]:
+        """
+        Возвращает не больше `top_size` лучших результатов уровня по убыванию.
+        """
+
+        return list(self.best_scores[level])
+
+    def write_scores(self):
+        # Результаты, которые еще не удалось записать. Ошибка базы не останавливает поток:
+        # они остаются здесь и записываются вместе со следующими
+        pending = []
+        # Об ошибках сообщается один раз, пока запись не удастся снова, чтобы не повторять сообщение каждую секунду
+        failing = False
+        stopping = False
+        attempts_left = self.close_attempts
+
+        while True:
+            # Всё, что накопилось в очереди, записывается одной транзакцией. None - сигнал завершения.
+            # Пока есть незаписанные результаты, новых ждать не дольше `retry_delay`
+            try:
+                batch = [self.scores_queue.get(timeout=self.retry_delay if pending else None)]
+            except Empty:
+                batch = []
+            while True:
+                try:
+                    batch.append(self.scores_queue.get_nowait())
+                except Empty:
+                    break
+
+            stopping = stopping or None in batch
+            pending += [item for item in batch if item is not None]
+            if pending:
+                if self.insert_scores(pending, report=not failing):
+                    pending = []
+                    failing = False
+                else:
+                    failing = True
+
+            if stopping:
+                if pending and attempts_left > 0:
+                    attempts_left -= 1
+                    continue
+                if pending:
+                    print(f'Таблица рекордов: не записано результатов - {len(pending)}')
+                return
+
+    def insert_scores(self, scores, report=True) -> bool:
+        """
+        Записывает результаты одной транзакцией. При ошибке базы, например если ее заблокировал другой процесс,
+        откатывает транзакцию и возвращает False.
+        """
+
+        with self.lock:
+            try:
+                for table, score in scores:
+                    self.connection.execute(f'INSERT INTO {table} VALUES (?)', (score,))
+                self.connection.commit()
+            except sqlite3.Error as error:
+                with suppress(sqlite3.Error):
+                    self.connection.rollback()
+                if report:
+                    print(f'Таблица рекордов: не удалось записать результаты ({error}), запись будет повторена')
+                return False
+        return True
+
+    def close(self):
+        """
+        Дописывает результаты, оставшиеся в очереди, и закрывает соединение.
+        """
+
+        self.scores_queue.put(None)
+        self.writer.join()
+        self.connection.close()
@@ -0,0 +1,194 @@
+"""
+Запись ввода игрока и повтор игры без экрана.
+Симуляция уровня зависит только от seed своего генератора случайных чисел и от ввода, поэтому для повтора
+достаточно сохранить seed и список действий с номерами шагов, на которых они были сделаны.
+
+Формат файла: заголовок `<4sBBI` (сигнатура, версия, уровень, seed), затем действия, затем итог игры.
+Действие - одно число переменной длины (7 бит на байт): `(шагов с прошлого действия << 3) | код действия`.
+Итог - такое же число с кодом `END`, за которым следует число очков.
+
+Повтор с проверкой итога и профилированием: `python Replay.py replays/main_20240101_120000.replay --profile`
+"""
+
+import argparse
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+MAGIC = b'BGRP'
+VERSION = 1
+HEADER = struct.Struct('<4sBBI')
+
+# Коды действий. Помещаются в три младших бита записи
+END, JUMP, FIRE, UP, DOWN, RELEASE, PAUSE = range(7)
+
+LEVELS = ['main', 'bird']
+
+
+class ReplayError(Exception):
+    """
+    Вызывается, если файл повтора поврежден или записан другой версией игры.
+    """
+
+
+@dataclass
+class Replay:
+    level: str
+    seed: int
+    # Пары (шаг, код действия) в порядке записи
+    inputs: List[Tuple[int, int]] = field(default_factory=list)
+    end_tick: int = 0
+    score: int = 0
+
+    def record(self, tick: int, code: int):
+        self.inputs.append((tick, code))
+
+    def finish(self, tick: int, score: int):
+        self.end_tick = tick
+        self.score = score
+
+    def save(self, path: str, mode='wb'):
+        """
+        Записывает игру в файл. С `mode='xb'` существующий файл не перезаписывается: выбрасывается `FileExistsError`.
+        """
+
+        data = bytearray(HEADER.pack(MAGIC, VERSION, LEVELS.index(self.level), self.seed))
+
+        last_tick = 0
+        for tick, code in [*self.inputs, (self.end_tick, END)]:
+            write_varint(data, (tick - last_tick) << 3 | code)
+            last_tick = tick
+        write_varint(data, self.score)
+
+        with open(path, mode) as file:
+            file.write(data)
+
+    @classmethod
+    def load(cls, path: str) -> 'Replay':
+        with open(path, 'rb') as file:
+            data = file.read()
+
+        if len(data) < HEADER.size:
+            raise ReplayError(f'{path}: файл слишком короткий')
+
+        magic, version, level, seed = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION or level >= len(LEVELS):
+            raise ReplayError(f'{path}: это не повтор или он записан другой версией игры')
+
+        replay = cls(LEVELS[level], seed)
+        position, tick = HEADER.size, 0
+        while True:
+            value, position = read_varint(data, position)
+            tick += value >> 3
+            if value & 7 == END:
+                break
+            replay.record(tick, value & 7)
+
+        score, _ = read_varint(data, position)
+        replay.finish(tick, score)
+        return replay
+
+
+def write_varint(data: bytearray, value: int):
+    while value >= 0x80:
+        data.append(value & 0x7f | 0x80)
+        value >>= 7
+    data.append(value)
+
+
+def read_varint(data: bytes, position: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        if position >= len(data):
+            raise ReplayError('Файл повтора обрывается посреди записи')
+
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, position
+
+
+def apply_input(simulation, code: int):
+    """
+    Передает действие игрока симуляции уровня. Пауза на симуляцию не влияет и только записывается.
+    """
+
+    if code == JUMP:
+        simulation.jump()
+    elif code == FIRE:
+        simulation.fire()
+    elif code == UP:
+        simulation.direction = -1
+    elif code == DOWN:
+        simulation.direction = 1
+    elif code == RELEASE:
+        simulation.direction = 0
+
+
+def play(replay: Replay, rules=None):
+    """
+    Повторяет игру без экрана с максимальной скоростью и возвращает симуляцию в конечном состоянии.
+    """
+
+    from Simulation import MainLevelSimulation, ImABirdLevelSimulation
+    simulation_class = MainLevelSimulation if replay.level == 'main' else ImABirdLevelSimulation
+
+    simulation = simulation_class(rules=rules, seed=replay.seed)
+    inputs = iter(replay.inputs)
+    next_input = next(inputs, None)
+
+    while simulation.tick < replay.end_tick and not simulation.game_over:
+        while next_input is not None and next_input[0] <= simulation.tick:
+            apply_input(simulation, next_input[1])
+            next_input = next(inputs, None)
+        simulation.step()
+
+    simulation.stop()
+    return simulation
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Повтор записанной игры без экрана')
+    parser.add_argument('path')
+    parser.add_argument('--repeat', type=int, default=1, help='сколько раз повторить игру подряд')
+    parser.add_argument('--profile', action='store_true', help='вывести профиль cProfile')
+    args = parser.parse_args()
+
+    replay = Replay.load(args.path)
+    # Пустой повтор загружает модули и картинки уровня, чтобы их загрузка не попала в замер
+    play(Replay(replay.level, replay.seed)).release()
+
+    def run():
+        results = []
+        for _ in range(args.repeat):
+            simulation = play(replay)
+            results.append(simulation)
+            simulation.release()
+        return results
+
+    started = time.perf_counter()
+    if args.profile:
+        import cProfile
+        import pstats
+        profile = cProfile.Profile()
+        results = profile.runcall(run)
+        pstats.Stats(profile).sort_stats('cumulative').print_stats(25)
+    else:
+        results = run()
+    elapsed = time.perf_counter() - started
+
+    simulation = results[-1]
+    ticks = sum(result.tick for result in results)
+    print(f'{replay.level}: seed {replay.seed}, действий {len(replay.inputs)}, шагов {simulation.tick}, '
+          f'очков {simulation.score}; {ticks / elapsed:.0f} шагов/с')
+
+    if (simulation.tick, simulation.score) != (replay.end_tick, replay.score):
+        print(f'Расхождение: в записи {replay.end_tick} шагов и {replay.score} очков')
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
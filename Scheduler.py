@@ -0,0 +1,64 @@
+import heapq
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+
+@dataclass
+class ScheduledCall:
+    callback: Callable[[], None]
+    # Период повторения в шагах. None - вызов один раз
+    period: Optional[int]
+    # Порядок постановки в очередь: вызовы на один и тот же шаг выполняются в этом порядке
+    order: int
+    cancelled: bool = False
+
+
+@dataclass
+class Scheduler:
+    """
+    Очередь отложенных и периодических вызовов по игровому времени - шагам симуляции уровня.
+    Вызовы хранятся в куче по шагу, на который они назначены, поэтому за шаг проверяется только ее вершина.
+    Очередь принадлежит уровню: пока уровень стоит на паузе, шаги не идут и вызовы не выполняются.
+    """
+
+    tick: int = 0
+    queue: List[Tuple[int, int, ScheduledCall]] = field(default_factory=list)
+    scheduled: int = field(init=False, default=0)
+
+    def schedule(self, delay: int, callback, period: int = None) -> ScheduledCall:
+        """
+        Назначает вызов `callback` через `delay` шагов, а затем, если задан `period`, каждые `period` шагов.
+        """
+
+        call = ScheduledCall(callback, period, self.scheduled)
+        self.scheduled += 1
+        heapq.heappush(self.queue, (self.tick + delay, call.order, call))
+        return call
+
+    def every(self, period: int, callback) -> ScheduledCall:
+        return self.schedule(period, callback, period)
+
+    @staticmethod
+    def cancel(call: ScheduledCall):
+        # Отмененный вызов остается в куче и выбрасывается, когда доходит до вершины
+        call.cancelled = True
+
+    def clear(self):
+        for _, _, call in self.queue:
+            call.cancelled = True
+        self.queue.clear()
+
+    def run_until(self, tick: int):
+        """
+        Продвигает время до шага `tick` и выполняет все вызовы, назначенные на него и на более ранние шаги.
+        """
+
+        self.tick = tick
+        while self.queue and self.queue[0][0] <= tick:
+            due, order, call = heapq.heappop(self.queue)
+            if call.cancelled:
+                continue
+
+            if call.period is not None:
+                heapq.heappush(self.queue, (due + call.period, order, call))
+            call.callback()
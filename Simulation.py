@@ -0,0 +1,253 @@
+import random
+from dataclasses import dataclass
+
+import pygame
+
+import Sprites
+from EntityArena import EntityArena
+from Scheduler import Scheduler
+from SpatialGrid import SpatialGrid
+from Sprites import TICKS_PER_SECOND
+
+
+@dataclass
+class LevelRules:
+    """
+    Числа, от которых зависит сложность уровней: рост сложности, скорость объектов, периоды и шансы появления.
+    Значения по умолчанию - те, с которыми идет обычная игра. Периоды отсчитываются в шагах симуляции,
+    а шансы - в процентах, как у `random.randint(0, 100)`.
+    """
+
+    start_difficulty: int = 20
+    max_difficulty: int = 100
+    difficulty_change_period: int = 5 * TICKS_PER_SECOND
+    # Скорость объектов: max(difficulty // speed_divisor, min_speed)
+    speed_divisor: int = 10
+    min_speed: int = 5
+
+    obstacle_spawn_period: int = TICKS_PER_SECOND
+    bird_spawn_period: int = int(1.5 * TICKS_PER_SECOND)
+    add_score_period: int = int(1.5 * TICKS_PER_SECOND)
+    enemy_spawn_period: int = int(1.5 * TICKS_PER_SECOND)
+
+    bullet_booster_chance: int = 10
+    health_booster_chance: int = 1
+
+
+class LevelSimulation:
+    """
+    Правила уровня без отрисовки: появление объектов, сложность, здоровье, прыжки и столкновения.
+    Мир продвигается на один шаг вызовом `step`, а периодические события выполняет очередь `Scheduler`
+    по номеру шага, поэтому симуляция не зависит ни от окна, ни от `pygame.time` и может работать без экрана
+    быстрее реального времени. Игровые циклы только передают в неё ввод и рисуют результат.
+    """
+
+    level = None
+
+    def __init__(self, *display_groups: pygame.sprite.AbstractGroup, width=1280, rules: LevelRules = None,
+                 seed: int = None):
+        self.width = width
+        self.rules = rules or LevelRules()
+        # Все случайные решения уровня берутся из своего генератора, поэтому игру можно повторить по seed и вводу
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.random = random.Random(self.seed)
+
+        self.tick = 0
+        self.difficulty = self.rules.start_difficulty
+        self.score = 0
+        self.game_over = False
+        # Вид объекта, из-за которого закончилась игра
+        self.death_cause = None
+        # Положения объектов перед последним шагом, между ними и текущими рисуется кадр
+        self.previous_positions = {}
+
+        # Объекты и группы этой игры. Дополнительно каждый объект попадает в `display_groups`,
+        # например в группу для отрисовки
+        self.arena = EntityArena(display_groups)
+        self.entities = self.arena.entities
+        self.collision_grid = SpatialGrid()
+        self.player = None
+        # `FrameProfiler` игры, в который шаг отмечает время движения объектов и столкновений. None - без замеров
+        self.profiler = None
+
+        # Периодические события уровня: рост сложности, появление объектов, начисление очков
+        self.scheduler = Scheduler()
+        self.scheduler.every(self.rules.difficulty_change_period, self.increase_difficulty)
+
+    @property
+    def move_speed(self) -> int:
+        return max(self.difficulty // self.rules.speed_divisor, self.rules.min_speed)
+
+    def spawn(self, sprite_class, *groups, **kwargs):
+        sprite = self.arena.spawn(sprite_class, *groups, **kwargs)
+        # Объект из пула мог остаться в `previous_positions` с прошлой жизни. Между шагами, например по вводу,
+        # он должен рисоваться на месте появления, а не между старым и новым положением
+        self.previous_positions[sprite] = sprite.rect.topleft
+        return sprite
+
+    def increase_difficulty(self):
+        self.difficulty = min(self.difficulty + 1, self.rules.max_difficulty)
+
+    def add_score(self):
+        self.score += 1
+
+    def step(self):
+        self.tick += 1
+        # События шага выполняются до движения объектов
+        self.scheduler.run_until(self.tick)
+
+        self.previous_positions = {sprite: sprite.rect.topleft for sprite in self.entities}
+        self.entities.update()
+        if self.profiler is not None:
+            self.profiler.mark('update')
+
+        self.update()
+        if self.profiler is not None:
+            self.profiler.mark('collision')
+
+    def stop(self):
+        """
+        Отменяет все запланированные события уровня. Вызывается, когда игра на уровне закончена или брошена.
+        """
+
+        self.scheduler.clear()
+
+    def release(self):
+        """
+        Заканчивает игру на уровне насовсем: отменяет события и убирает все объекты уровня из групп,
+        в том числе из групп отрисовки, возвращая их в пулы. После этого симуляцию нельзя продолжить.
+        """
+
+        self.stop()
+        self.arena.release()
+        self.previous_positions = {}
+
+    def update(self) -> None:
+        """
+        Правила уровня, которые выполняются каждый шаг после движения объектов, например столкновения.
+        """
+
+
+class MainLevelSimulation(LevelSimulation):
+    level = 'main'
+
+    def __init__(self, *display_groups, width=1280, rules=None, seed=None):
+        super().__init__(*display_groups, width=width, rules=rules, seed=seed)
+        self.health = 3
+        self.bullets = 5
+
+        self.obstacle_sprites = self.arena.group()
+        self.birds_sprites = self.arena.group()
+        self.bullet_booster_sprites = self.arena.group()
+        self.health_booster_sprites = self.arena.group()
+        self.bullet_sprites = self.arena.group()
+
+        self.player = self.spawn(Sprites.AnimatedPlayerSprite, x=100, y=320)
+
+        self.scheduler.every(self.rules.obstacle_spawn_period, self.spawn_obstacle)
+        self.scheduler.every(self.rules.bird_spawn_period, self.spawn_bird)
+        self.scheduler.every(self.rules.add_score_period, self.add_score)
+
+    def jump(self):
+        self.player.jump()
+
+    def fire(self):
+        if self.bullets <= 0:
+            return
+
+        self.bullets -= 1
+        self.spawn(
+            Sprites.BulletSprite, self.bullet_sprites,
+            x=self.player.rect.centerx + 80, y=self.player.rect.centery - 23,
+        )
+
+    def update(self):
+        self.collision_grid.rebuild(self.obstacle_sprites, self.bullet_booster_sprites, self.health_booster_sprites)
+
+        collisions = self.collision_grid.spritecollide(self.player, self.obstacle_sprites, True)
+        if collisions:
+            self.health -= 1
+            if self.health <= 0:
+                self.game_over = True
+                # Столкнувшиеся спрайты уже убраны из групп, поэтому вид определяется по классу
+                hit_bird = any(isinstance(sprite, Sprites.MovingBirdSprite) for sprite in collisions)
+                self.death_cause = 'bird' if hit_bird else 'obstacle'
+
+        if self.collision_grid.spritecollide(self.player, self.bullet_booster_sprites, True):
+            self.bullets += 1
+
+        if self.collision_grid.spritecollide(self.player, self.health_booster_sprites, True):
+            self.health = min(self.health + 1, 3)
+
+        for bullet in self.bullet_sprites:
+            if self.collision_grid.spritecollide(bullet, self.birds_sprites, True):
+                bullet.kill()
+
+    def spawn_obstacle(self):
+        if self.random.randint(0, 100) <= self.rules.bullet_booster_chance:
+            self.spawn(
+                Sprites.BulletBoosterSprite, self.bullet_booster_sprites,
+                x=self.width, y=540, move_speed=self.move_speed,
+            )
+        elif self.random.randint(0, 100) <= self.rules.health_booster_chance:
+            self.spawn(
+                Sprites.HealthBoosterSprite, self.health_booster_sprites,
+                x=self.width, y=510, move_speed=self.move_speed,
+            )
+        elif self.random.randint(0, 100) < self.difficulty:
+            self.spawn(
+                Sprites.ObstacleSprite, self.obstacle_sprites,
+                x=self.width, y=515, move_speed=self.move_speed,
+            )
+
+    def spawn_bird(self):
+        if self.random.randint(0, 100) < self.difficulty:
+            self.spawn(
+                Sprites.MovingBirdSprite, self.obstacle_sprites, self.birds_sprites,
+                x=self.width, y=150, move_speed=self.move_speed,
+            )
+
+
+class ImABirdLevelSimulation(LevelSimulation):
+    level = 'bird'
+
+    def __init__(self, *display_groups, width=1280, rules=None, seed=None):
+        super().__init__(*display_groups, width=width, rules=rules, seed=seed)
+        # Направление полета игрока: -1 - вверх, 1 - вниз, 0 - на месте
+        self.direction = 0
+
+        self.obstacle_sprites = self.arena.group()
+        self.enemies_sprites = self.arena.group()
+
+        self.player = self.spawn(Sprites.PlayableBird, x=100, y=220)
+
+        self.scheduler.every(self.rules.enemy_spawn_period, self.spawn_enemy)
+
+    def update(self):
+        if self.direction < 0:
+            self.player.up()
+        elif self.direction > 0:
+            self.player.down()
+
+        self.collision_grid.rebuild(self.obstacle_sprites, self.enemies_sprites)
+
+        if self.collision_grid.spritecollide(self.player, self.obstacle_sprites, True):
+            self.game_over = True
+            self.death_cause = 'enemy_bullet'
+
+        if self.collision_grid.spritecollide(self.player, self.enemies_sprites, True):
+            self.score += 1
+
+    def spawn_enemy(self):
+        if self.random.randint(0, 100) < self.difficulty:
+            self.spawn(
+                Sprites.EnemySprite, self.enemies_sprites,
+                x=self.width, y=320, move_speed=self.move_speed, rng=self.random,
+            )
+            self.spawn(Sprites.EnemyBulletSprite, self.obstacle_sprites, x=self.width, y=420)
+        elif self.random.randint(0, 100) < self.difficulty:
+            self.spawn(
+                Sprites.EnemyOnPlaneSprite, self.enemies_sprites,
+                x=self.width, y=100, move_speed=self.move_speed,
+            )
+            self.spawn(Sprites.EnemyBulletSprite, self.obstacle_sprites, x=self.width, y=180)
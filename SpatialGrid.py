@@ -0,0 +1,60 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+import pygame
+
+
+@dataclass
+class SpatialGrid:
+    """
+    Равномерная сетка для грубой фазы проверки столкновений.
+    Строки сетки совпадают с полосами, по которым движутся объекты уровня, поэтому при проверке
+    по маске сравниваются только объекты из тех же ячеек, а не все спрайты группы.
+    Объекты уровня двигаются каждый кадр, поэтому сетка перестраивается после их обновления.
+    """
+
+    cell_width: int = 160
+    lane_height: int = 90
+    cells: Dict[Tuple[int, int], List[pygame.sprite.Sprite]] = field(init=False,
+                                                                      default_factory=lambda: defaultdict(list))
+
+    def rebuild(self, *groups: pygame.sprite.AbstractGroup):
+        self.cells.clear()
+        for group in groups:
+            for sprite in group:
+                for cell in self.cells_of(sprite.rect):
+                    self.cells[cell].append(sprite)
+
+    def cells_of(self, rect: pygame.Rect):
+        for column in range(rect.left // self.cell_width, (rect.right - 1) // self.cell_width + 1):
+            for lane in range(rect.top // self.lane_height, (rect.bottom - 1) // self.lane_height + 1):
+                yield column, lane
+
+    def candidates(self, rect: pygame.Rect) -> set:
+        """
+        Возвращает спрайты, которые лежат в тех же ячейках, что и `rect`.
+        """
+
+        result = set()
+        for cell in self.cells_of(rect):
+            if cell in self.cells:
+                result.update(self.cells[cell])
+        return result
+
+    def spritecollide(self, sprite, group, dokill, collided=pygame.sprite.collide_mask) -> list:
+        """
+        Аналог `pygame.sprite.spritecollide`, который проверяет только спрайты из соседних ячеек.
+        Спрайты, убитые после перестроения сетки, не учитываются.
+        """
+
+        collisions = [
+            candidate for candidate in self.candidates(sprite.rect)
+            if candidate in group and sprite.rect.colliderect(candidate.rect) and collided(sprite, candidate)
+        ]
+
+        if dokill:
+            for candidate in collisions:
+                candidate.kill()
+
+        return collisions
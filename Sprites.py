@@ -1,29 +1,208 @@
+import glob
+import hashlib
+import io
+import json
+import mmap
 import os
+import struct
 import sys
+from dataclasses import dataclass, field
+from typing import Dict
 
 import pygame
 import random
 
 
-def load_image(name, color_key=None):
-    fullname = os.path.join('assets', 'images', name)
+# Число шагов игрового мира в секунду. Скорости спрайтов заданы в пикселях за шаг
+TICKS_PER_SECOND = 60
+
+IMAGES_DIR = os.path.join('assets', 'images')
+ATLAS_DIR = os.path.join('assets', 'atlas')
+CACHE_DIR = os.path.join('assets', 'cache')
+
+# Загруженные изображения, атласы и индекс атласов, общие для всего процесса
+images: Dict[tuple, pygame.Surface] = {}
+atlases: Dict[str, pygame.Surface] = {}
+atlas_index = None
+# Отображенные в память файлы кэша, на которые ссылаются поверхности из `pygame.image.frombuffer`
+mapped_files = []
+
+# Порядок байт пикселя в памяти для масок поверхности
+PIXEL_FORMATS = {
+    (0xff0000, 0xff00, 0xff, 0xff000000): 'BGRA',
+    (0xff, 0xff00, 0xff0000, 0xff000000): 'RGBA',
+    (0xff00, 0xff0000, 0xff000000, 0xff): 'ARGB',
+}
+
+
+def read_image(fullname):
+    """
+    Загружает изображение и приводит его к формату пикселей экрана.
+    Результат преобразования хранится в `CACHE_DIR` под хэшем исходного файла и формата пикселей,
+    поэтому при следующих запусках PNG не распаковывается, а файл кэша отображается в память.
+    Кэш пересобирается, как только меняется исходный файл.
+    """
+
     if not os.path.isfile(fullname):
         print(f"Файл с изображением '{fullname}' не найден")
         sys.exit()
-    image = pygame.image.load(fullname)
+
+    with open(fullname, 'rb') as file:
+        data = file.read()
+
+    if pygame.display.get_surface() is None:
+        # Без окна (например, в безголовой симуляции) изображение нужно только для размеров и масок
+        return pygame.image.load(io.BytesIO(data), fullname)
+
+    target_masks = pygame.Surface((1, 1)).convert_alpha().get_masks()
+    pixel_format = PIXEL_FORMATS.get(target_masks)
+    if pixel_format is None:
+        return pygame.image.load(io.BytesIO(data), fullname).convert_alpha()
+
+    name = os.path.basename(fullname)
+    cache_path = os.path.join(CACHE_DIR, f'{name}.{hashlib.sha1(data).hexdigest()}.{pixel_format}.raw')
+
+    if os.path.isfile(cache_path) and os.path.getsize(cache_path) > 8:
+        with open(cache_path, 'rb') as file:
+            mapped_file = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+        width, height = struct.unpack_from('<II', mapped_file)
+        if len(mapped_file) == 8 + width * height * 4:
+            image = pygame.image.frombuffer(memoryview(mapped_file)[8:], (width, height), pixel_format)
+            mapped_files.append(mapped_file)
+            return image
+        mapped_file.close()
+
+    image = pygame.image.load(io.BytesIO(data), fullname).convert_alpha()
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        for stale_path in glob.glob(os.path.join(CACHE_DIR, f'{glob.escape(name)}.*.{pixel_format}.raw')):
+            os.remove(stale_path)
+        with open(cache_path + '.tmp', 'wb') as file:
+            file.write(struct.pack('<II', *image.get_size()))
+            file.write(pygame.image.tobytes(image, pixel_format))
+        os.replace(cache_path + '.tmp', cache_path)
+    except OSError:
+        # Без кэша игра работает так же, только запускается медленнее
+        pass
+    return image
+
+
+def get_atlas_index() -> dict:
+    """
+    Возвращает индекс `имя -> (атлас, прямоугольник)`, собранный `build_atlas.py`.
+    Если атласы не собраны, индекс пустой и картинки загружаются из отдельных файлов.
+    Картинки, которые изменились после сборки атласа, из индекса убираются.
+    """
+
+    global atlas_index
+    if atlas_index is None:
+        index_path = os.path.join(ATLAS_DIR, 'index.json')
+        atlas_index = {}
+        if os.path.isfile(index_path):
+            with open(index_path, encoding='utf-8') as file:
+                atlas_index = remove_stale_entries(json.load(file))
+    return atlas_index
+
+
+def remove_stale_entries(index: dict) -> dict:
+    """
+    Убирает из индекса картинки, чей исходный файл в `IMAGES_DIR` не совпадает по sha1 с записанным при сборке,
+    и сообщает об этом один раз для каждого атласа. Хэш считается только для файлов, у которых размер или время
+    изменения отличаются от записанных в `CACHE_DIR` при прошлой проверке, поэтому обычный запуск не открывает
+    исходные файлы, а делает только `os.stat`. Если исходного файла нет, атлас считается верным.
+    """
+
+    stamps_path = os.path.join(CACHE_DIR, 'atlas_sources.json')
+    try:
+        with open(stamps_path, encoding='utf-8') as file:
+            stamps = json.load(file)
+    except (OSError, ValueError):
+        stamps = {}
+
+    current = {}
+    stale = {}
+    checked = False
+    for name, entry in index.items():
+        try:
+            stat = os.stat(os.path.join(IMAGES_DIR, name))
+        except OSError:
+            current[name] = entry
+            continue
+
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        digest = stamps.get(name, {}).get('sha1') if stamps.get(name, {}).get('stat') == stamp else None
+        if digest is None:
+            with open(os.path.join(IMAGES_DIR, name), 'rb') as file:
+                digest = hashlib.sha1(file.read()).hexdigest()
+            stamps[name] = {'stat': stamp, 'sha1': digest}
+            checked = True
+
+        if digest == entry.get('sha1'):
+            current[name] = entry
+        else:
+            stale.setdefault(entry['atlas'], []).append(name)
+
+    for atlas, names in stale.items():
+        print(f"Изображения {', '.join(names)} изменились после сборки атласа {atlas} и загружаются "
+              f"из отдельных файлов. Чтобы обновить атлас, запустите build_atlas.py")
+
+    if checked:
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with open(stamps_path + '.tmp', 'w', encoding='utf-8') as file:
+                json.dump(stamps, file)
+            os.replace(stamps_path + '.tmp', stamps_path)
+        except OSError:
+            # Без записанных проверок файлы будут хэшироваться и при следующем запуске
+            pass
+
+    return current
+
+
+def load_atlas(name):
+    if name not in atlases:
+        atlases[name] = read_image(os.path.join(ATLAS_DIR, name))
+    return atlases[name]
+
+
+def load_image(name, color_key=None):
+    if (name, color_key) in images:
+        return images[name, color_key]
+
+    atlas_entry = get_atlas_index().get(name)
+    if atlas_entry is not None:
+        image = load_atlas(atlas_entry['atlas']).subsurface(atlas_entry['rect'])
+    else:
+        image = read_image(os.path.join(IMAGES_DIR, name))
+
     if color_key is not None:
         image = image.convert()
-        if color_key == -1:
-            color_key = image.get_at((0, 0))
-        image.set_colorkey(color_key)
-    else:
-        image = image.convert_alpha()
+        # -1 - цвет левой верхней точки. Картинка кэшируется под ключом вызова, а не под найденным цветом
+        image.set_colorkey(image.get_at((0, 0)) if color_key == -1 else color_key)
+
+    images[name, color_key] = image
     return image
 
 
+class LazyImage:
+    """
+    Изображение спрайта, которое загружается при первом обращении, то есть при создании первого
+    экземпляра класса, а не при импорте модуля.
+    """
+
+    def __init__(self, name, color_key=None):
+        self.name = name
+        self.color_key = color_key
+
+    def __get__(self, instance, owner) -> pygame.Surface:
+        return load_image(self.name, self.color_key)
+
+
 class BaseSprite(pygame.sprite.Sprite):
     image = None
     apply_mask = False
+    # Маска изображения, общая для всех экземпляров класса. Строится при создании первого экземпляра
+    image_mask = None
 
     def __init__(self, *group, x=0, y=0):
         super().__init__(*group)
@@ -31,7 +210,10 @@ class BaseSprite(pygame.sprite.Sprite):
         self.rect = self.image.get_rect()
         self.rect.x, self.rect.y = x, y
         if self.apply_mask:
-            self.mask = pygame.mask.from_surface(self.image)
+            cls = type(self)
+            if cls.__dict__.get('image_mask') is None:
+                cls.image_mask = pygame.mask.from_surface(cls.image)
+            self.mask = cls.image_mask
 
 
 class BaseAnimatedSprite(pygame.sprite.Sprite):
@@ -39,61 +221,146 @@ class BaseAnimatedSprite(pygame.sprite.Sprite):
     columns = rows = 0
     animation_speed = 0
     apply_mask = False
+    # Кадры, их маски и размер кадра, общие для всех экземпляров класса.
+    # Нарезаются из `sheet` при создании первого экземпляра
+    frames = None
+    frame_masks = None
+    frame_size = None
 
     def __init__(self, *group, x=0, y=0):
         super().__init__(*group)
-        self.frames = []
         self.cut_sheet()
         self.cur_frame = 0
         self.image = self.frames[self.cur_frame]
-        self.rect = self.rect.move(x, y)
-        self.last_animation_update = 0
+        self.rect = pygame.Rect((x, y), self.frame_size)
+        self.ticks_since_animation = 0
         if self.apply_mask:
-            self.mask = pygame.mask.from_surface(self.image)
+            self.mask = self.frame_masks[self.cur_frame]
+
+    @classmethod
+    def cut_sheet(cls):
+        if cls.__dict__.get('frames') is not None:
+            return
 
-    def cut_sheet(self):
-        self.rect = pygame.Rect(0, 0, self.sheet.get_width() // self.columns, self.sheet.get_height() // self.rows)
+        width, height = cls.sheet.get_width() // cls.columns, cls.sheet.get_height() // cls.rows
+        frames = []
+        for j in range(cls.rows):
+            for i in range(cls.columns):
+                frame_location = (width * i, height * j)
+                frames.append(cls.sheet.subsurface(pygame.Rect(frame_location, (width, height))))
 
-        for j in range(self.rows):
-            for i in range(self.columns):
-                frame_location = (self.rect.w * i, self.rect.h * j)
-                self.frames.append(self.sheet.subsurface(pygame.Rect(frame_location, self.rect.size)))
+        cls.frame_size = (width, height)
+        cls.frames = tuple(frames)
+        if cls.apply_mask:
+            cls.frame_masks = tuple(pygame.mask.from_surface(frame) for frame in frames)
 
     def update(self):
-        if pygame.time.get_ticks() - self.last_animation_update > 1000 / self.animation_speed:
-            self.last_animation_update = pygame.time.get_ticks()
+        self.ticks_since_animation += 1
+        if self.ticks_since_animation > TICKS_PER_SECOND / self.animation_speed:
+            self.ticks_since_animation = 0
             self.cur_frame = (self.cur_frame + 1) % len(self.frames)
             self.image = self.frames[self.cur_frame]
             if self.apply_mask:
-                self.mask = pygame.mask.from_surface(self.image)
+                self.mask = self.frame_masks[self.cur_frame]
+
+
+@dataclass
+class SpritePool:
+    """
+    Пул освободившихся спрайтов одного класса.
+    `acquire` повторно инициализирует свободный спрайт вместо создания нового, `release` возвращает спрайт в пул.
+    """
+
+    sprite_class: type
+    free: list = field(default_factory=list)
+    hits: int = 0
+    misses: int = 0
+
+    def acquire(self, *group, **kwargs):
+        if not self.free:
+            self.misses += 1
+            return self.sprite_class(*group, **kwargs)
+
+        self.hits += 1
+        sprite = self.free.pop()
+        sprite.__init__(*group, **kwargs)
+        return sprite
+
+    def release(self, sprite):
+        self.free.append(sprite)
+
+    @property
+    def size(self) -> int:
+        return len(self.free)
+
+    @property
+    def hit_rate(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+
+sprite_pools: Dict[type, SpritePool] = {}
+
+
+def get_pool(sprite_class) -> SpritePool:
+    if sprite_class not in sprite_pools:
+        sprite_pools[sprite_class] = SpritePool(sprite_class)
+    return sprite_pools[sprite_class]
+
+
+def pools_stats() -> dict:
+    """
+    Возвращает размер и долю попаданий пула каждого класса спрайтов.
+    """
+
+    return {
+        sprite_class.__name__: {'size': pool.size, 'hit_rate': pool.hit_rate}
+        for sprite_class, pool in sprite_pools.items()
+    }
+
+
+class PooledSprite:
+    """
+    Примесь для часто появляющихся спрайтов. Такие спрайты создаются через `spawn`,
+    а после `kill` (ухода за экран или столкновения) возвращаются в пул своего класса.
+    """
+
+    @classmethod
+    def spawn(cls, *group, **kwargs):
+        return get_pool(cls).acquire(*group, **kwargs)
+
+    def kill(self):
+        if self.alive():
+            super().kill()
+            get_pool(type(self)).release(self)
 
 
 class MainMenuBackground(BaseSprite):
-    image = load_image("main_menu_background.png")
+    image = LazyImage("main_menu_background.png")
 
 
 class PlayerSprite(BaseSprite):
-    image = load_image("player.png")
+    image = LazyImage("player.png")
 
 
 class GameNameSprite(BaseSprite):
-    image = load_image("game_name.png")
+    image = LazyImage("game_name.png")
 
 
 class CloudsSprite(BaseSprite):
-    image = load_image("clouds.png")
+    image = LazyImage("clouds.png")
 
 
 class BirdSprite(BaseSprite):
-    image = load_image("bird.png")
+    image = LazyImage("bird.png")
 
 
 class GroundSprite(BaseSprite):
-    image = load_image("ground.png")
+    image = LazyImage("ground.png")
 
 
-class ObstacleSprite(BaseSprite):
-    image = load_image("obstacle.png")
+class ObstacleSprite(PooledSprite, BaseSprite):
+    image = LazyImage("obstacle.png")
     apply_mask = True
 
     def __init__(self, *group, x=0, y=0, move_speed=5):
@@ -106,8 +373,8 @@ class ObstacleSprite(BaseSprite):
             self.kill()
 
 
-class MovingBirdSprite(BaseSprite):
-    image = load_image("Bird.png")
+class MovingBirdSprite(PooledSprite, BaseSprite):
+    image = LazyImage("Bird.png")
     apply_mask = True
 
     def __init__(self, *group, x=0, y=0, move_speed=5):
@@ -121,36 +388,28 @@ class MovingBirdSprite(BaseSprite):
 
 
 class HeartSprite(BaseSprite):
-    image = load_image("heart.png")
+    image = LazyImage("heart.png")
 
 
 class ScoreSprite(BaseSprite):
-    image = load_image('score.png')
-
-    def move(self, screen_width, text_width):
-        self.rect.x = screen_width - text_width - 100
+    image = LazyImage('score.png')
 
 
-class BulletSprite(BaseSprite):
-    image = load_image('bullet.png')
-
-    def __init__(self, *group, x=0, y=0, birds_sprite_group):
-        super().__init__(*group, x=x, y=y)
-        self.birds_sprite_group = birds_sprite_group
+class BulletSprite(PooledSprite, BaseSprite):
+    image = LazyImage('bullet.png')
 
     def update(self):
         self.rect.x += 10
-        if (pygame.sprite.spritecollide(self, self.birds_sprite_group, True, pygame.sprite.collide_mask) or
-                self.rect.x > 1280 - self.rect.w):
+        if self.rect.x > 1280 - self.rect.w:
             self.kill()
 
 
 class BulletIcon(BaseSprite):
-    image = load_image('bullet_icon.png')
+    image = LazyImage('bullet_icon.png')
 
 
-class BulletBoosterSprite(BaseSprite):
-    image = load_image('bullet_booster.png')
+class BulletBoosterSprite(PooledSprite, BaseSprite):
+    image = LazyImage('bullet_booster.png')
 
     def __init__(self, *group, x=0, y=0, move_speed=5):
         super().__init__(*group, x=x, y=y)
@@ -162,8 +421,8 @@ class BulletBoosterSprite(BaseSprite):
             self.kill()
 
 
-class HealthBoosterSprite(BaseSprite):
-    image = load_image('health_booster.png')
+class HealthBoosterSprite(PooledSprite, BaseSprite):
+    image = LazyImage('health_booster.png')
     apply_mask = True
 
     def __init__(self, *group, x=0, y=0, move_speed=5):
@@ -177,7 +436,7 @@ class HealthBoosterSprite(BaseSprite):
 
 
 class AnimatedPlayerSprite(BaseAnimatedSprite):
-    sheet = load_image("animated_player.png")
+    sheet = LazyImage("animated_player.png")
     columns = 4
     rows = 1
     animation_speed = 20
@@ -204,34 +463,36 @@ class AnimatedPlayerSprite(BaseAnimatedSprite):
     def jump(self):
         self.is_jumping = True
         self.image = self.frames[0]
-        self.mask = pygame.mask.from_surface(self.image)
+        self.mask = self.frame_masks[0]
 
 
-class EnemySprite(BaseAnimatedSprite):
-    sheet = load_image("animated_player_to_left.png")
+class EnemySprite(PooledSprite, BaseAnimatedSprite):
+    sheet = LazyImage("animated_player_to_left.png")
     columns = 4
     rows = 1
     animation_speed = 20
     jump_height = 4
     apply_mask = True
 
-    def __init__(self, *group, x=0, y=0, move_speed=5):
+    def __init__(self, *group, x=0, y=0, move_speed=5, rng=random):
         super().__init__(*group, x=x, y=y)
         self.move_speed = move_speed
+        # Генератор случайных чисел уровня, от которого зависят прыжки
+        self.rng = rng
         self.is_jumping = False
         self.jump_frames = 25
 
     def jump(self):
         self.is_jumping = True
         self.image = self.frames[0]
-        self.mask = pygame.mask.from_surface(self.image)
+        self.mask = self.frame_masks[0]
 
     def update(self):
         self.rect.x -= self.move_speed
         if self.rect.x < -self.rect.w:
             self.kill()
 
-        if self.rect.x >= 500 and random.randint(0, 100) <= 1:
+        if self.rect.x >= 500 and self.rng.randint(0, 100) <= 1:
             self.jump()
 
         if not self.is_jumping:
@@ -247,7 +508,7 @@ class EnemySprite(BaseAnimatedSprite):
 
 
 class PlayableBird(BaseAnimatedSprite):
-    sheet = load_image("bird_animation_to_right.png")
+    sheet = LazyImage("bird_animation_to_right.png")
     columns = 2
     rows = 1
     animation_speed = 10
@@ -262,16 +523,14 @@ class PlayableBird(BaseAnimatedSprite):
     def up(self):
         if self.rect.y > 10:
             self.rect.y -= 15
-            self.mask = pygame.mask.from_surface(self.image)
 
     def down(self):
         if self.rect.y < 540 - self.rect.h:
             self.rect.y += 15
-            self.mask = pygame.mask.from_surface(self.image)
 
 
-class EnemyBulletSprite(BaseSprite):
-    image = load_image("bullet_to_left.png")
+class EnemyBulletSprite(PooledSprite, BaseSprite):
+    image = LazyImage("bullet_to_left.png")
     apply_mask = True
 
     def update(self):
@@ -280,8 +539,8 @@ class EnemyBulletSprite(BaseSprite):
             self.kill()
 
 
-class EnemyOnPlaneSprite(BaseSprite):
-    image = load_image("plane.png")
+class EnemyOnPlaneSprite(PooledSprite, BaseSprite):
+    image = LazyImage("plane.png")
     apply_mask = True
 
     def __init__(self, *group, x=0, y=0, move_speed=5):
@@ -295,48 +554,48 @@ class EnemyOnPlaneSprite(BaseSprite):
 
 
 class PlayButton(BaseSprite):
-    image = load_image("play_btn.png")
+    image = LazyImage("play_btn.png")
 
 
 class BirdModeButton(BaseSprite):
-    image = load_image("bird_mode_btn.png")
+    image = LazyImage("bird_mode_btn.png")
 
 
 class ExitMenuButton(BaseSprite):
-    image = load_image("exit_btn.png")
+    image = LazyImage("exit_btn.png")
 
 
 class RecordsButton(BaseSprite):
-    image = load_image("records_btn.png")
+    image = LazyImage("records_btn.png")
 
 
 class PauseBackground(BaseSprite):
-    image = load_image("pause_background.png")
+    image = LazyImage("pause_background.png")
 
 
 class GameOverBackground(BaseSprite):
-    image = load_image("game_over_background.png")
+    image = LazyImage("game_over_background.png")
 
 
 class RestartButton(BaseSprite):
-    image = load_image("restart_btn.png")
+    image = LazyImage("restart_btn.png")
 
 
 class PauseDarkBackground(BaseSprite):
-    image = load_image("pause_dark_background.png")
+    image = LazyImage("pause_dark_background.png")
 
 
 class GameOverText(BaseSprite):
-    image = load_image("game_over_text.png")
+    image = LazyImage("game_over_text.png")
 
 
 class YouGotPoints(BaseSprite):
-    image = load_image("you_got_points.png")
+    image = LazyImage("you_got_points.png")
 
 
 class ReturnToMainMenuButton(BaseSprite):
-    image = load_image("return_to_main_menu_btn.png")
+    image = LazyImage("return_to_main_menu_btn.png")
 
 
 class ContinuationButton(BaseSprite):
-    image = load_image("continuation_btn.png")
+    image = LazyImage("continuation_btn.png")
@@ -1,6 +1,6 @@
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Tuple, Set
+from typing import Tuple
 
 
 class GameState(Enum):
@@ -27,20 +27,18 @@ class StateError(Exception):
 class StateMachine:
     game_loops: Tuple
     state: GameState = field(default=GameState.UNKNOWN)
-    previous_states: Set[GameState] = field(default_factory=set)
 
     def set_state(self, new_state, **kwargs):
+        # Сбрасывается только цикл покидаемого состояния: остальные были сброшены, когда их покидали,
+        # поэтому цикл нового состояния в любом случае начнется заново
         for game_loop in self.game_loops:
-
-            for previous_state in self.previous_states:
-                if game_loop.linked_game_state == previous_state:
-                    game_loop.reset()
+            if game_loop.linked_game_state == self.state:
+                game_loop.reset()
 
             if game_loop.linked_game_state == new_state:
                 game_loop.set_presets(kwargs)
 
         self.state = new_state
-        self.previous_states.add(new_state)
 
     def assert_state_is(self, *expected_states: GameState):
         """
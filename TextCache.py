@@ -0,0 +1,32 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import pygame
+
+
+@dataclass
+class TextCache:
+    """
+    Кэш отрисованных надписей. Надпись заново рендерится шрифтом только тогда, когда меняется её текст,
+    а давно не использовавшиеся надписи вытесняются из кэша (LRU).
+    """
+
+    max_size: int = 64
+    surfaces: OrderedDict = field(init=False, default_factory=OrderedDict)
+
+    def render(self, font: pygame.font.Font, text: str, color, antialias=True) -> pygame.Surface:
+        key = (font, text, color, antialias)
+
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+
+        surface = font.render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
@@ -0,0 +1,68 @@
+from dataclasses import dataclass, field
+from typing import Tuple
+from weakref import WeakKeyDictionary
+
+import pygame
+
+
+@dataclass
+class Viewport:
+    """
+    Перевод из игровых координат в размер, в котором кадр рисуется на самом деле.
+    Правила уровней, столкновения и расположение интерфейса всегда считаются в `logical_size` (1280x720),
+    а кадр может рисоваться в меньшем `size` - например 640x360 - и растягиваться до окна видеокартой
+    (`pygame.SCALED`). Тогда каждая картинка уменьшается один раз при первом выводе и дальше берется из кэша,
+    а в каждом кадре пересчитываются только позиции.
+    """
+
+    logical_size: Tuple[int, int] = (1280, 720)
+    size: Tuple[int, int] = (1280, 720)
+    # Уменьшенные картинки. Ключи слабые: надпись, вытесненная из кэша надписей, уходит и отсюда
+    images: WeakKeyDictionary = field(init=False, default_factory=WeakKeyDictionary)
+
+    def __post_init__(self):
+        self.scale_x = self.size[0] / self.logical_size[0]
+        self.scale_y = self.size[1] / self.logical_size[1]
+
+    @property
+    def scaled(self) -> bool:
+        return self.size != self.logical_size
+
+    def image(self, surface: pygame.Surface) -> pygame.Surface:
+        if not self.scaled:
+            return surface
+
+        image = self.images.get(surface)
+        if image is None:
+            width, height = surface.get_size()
+            size = (max(round(width * self.scale_x), 1), max(round(height * self.scale_y), 1))
+
+            color_key = surface.get_colorkey()
+            if color_key is None:
+                image = pygame.transform.smoothscale(surface, size)
+            else:
+                # Сглаживание смешало бы края с цветом ключа, поэтому такие картинки уменьшаются без него
+                image = pygame.transform.scale(surface, size)
+                image.set_colorkey(color_key)
+            self.images[surface] = image
+        return image
+
+    def point(self, position) -> Tuple[int, int]:
+        return round(position[0] * self.scale_x), round(position[1] * self.scale_y)
+
+    def blits(self, blits: list) -> list:
+        """
+        Переводит пары (картинка, позиция в игровых координатах) в пары для `Surface.blits` в размере кадра.
+        """
+
+        if not self.scaled:
+            return blits
+        return [(self.image(surface), self.point(position)) for surface, position in blits]
+
+    def to_logical(self, position) -> Tuple[int, int]:
+        """
+        Переводит точку кадра, например положение мыши, в игровые координаты.
+        """
+
+        x, y = position
+        return int(x / self.scale_x), int(y / self.scale_y)
@@ -0,0 +1,151 @@
+"""
+Нагрузочная проверка сетки столкновений: на основном уровне всё время живут сотни препятствий, птиц и пуль,
+разбросанных по всему экрану. В каждом кадре те же проверки, что делает уровень (игрок с препятствиями
+и бонусами, пули с птицами), выполняются через `SpatialGrid` и через `pygame.sprite.spritecollide`.
+Попадания должны совпадать; время обоих способов попадает в отчет.
+
+Если хотя бы в одном кадре попадания разошлись, скрипт завершается с кодом 1.
+Пример: `python benchmarks/collisions.py --obstacles 300 --birds 200 --bullets 200 --output collisions.json`
+"""
+
+import os
+
+# Окно не нужно, а приветствие pygame не должно попадать в JSON
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['SDL_AUDIODRIVER'] = 'dummy'
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+
+import argparse
+import json
+import random
+import sys
+import time
+
+from run import ROOT, git_commit, percentiles
+
+
+def refill(simulation, rng: random.Random, obstacles: int, birds: int, bullets: int):
+    """
+    Добавляет объекты в случайные места экрана, пока их снова не станет заданное число.
+    """
+
+    import Sprites
+
+    width = simulation.width
+    # Птицы входят и в группу препятствий, поэтому препятствия считаются без них
+    while len(simulation.obstacle_sprites) - len(simulation.birds_sprites) < obstacles:
+        simulation.spawn(
+            Sprites.ObstacleSprite, simulation.obstacle_sprites,
+            x=rng.randrange(width), y=rng.randrange(0, 620), move_speed=simulation.move_speed,
+        )
+    while len(simulation.birds_sprites) < birds:
+        simulation.spawn(
+            Sprites.MovingBirdSprite, simulation.obstacle_sprites, simulation.birds_sprites,
+            x=rng.randrange(width), y=rng.randrange(0, 620), move_speed=simulation.move_speed,
+        )
+    while len(simulation.bullet_sprites) < bullets:
+        simulation.spawn(Sprites.BulletSprite, simulation.bullet_sprites, x=rng.randrange(width - 60),
+                         y=rng.randrange(0, 680))
+
+
+def queries(simulation) -> list:
+    """
+    Проверки одного шага основного уровня в виде пар (спрайт, группа).
+    """
+
+    return [
+        (simulation.player, simulation.obstacle_sprites),
+        (simulation.player, simulation.bullet_booster_sprites),
+        (simulation.player, simulation.health_booster_sprites),
+        *((bullet, simulation.birds_sprites) for bullet in simulation.bullet_sprites),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сетка столкновений под нагрузкой и сверка с pygame')
+    parser.add_argument('--frames', type=int, default=120)
+    parser.add_argument('--obstacles', type=int, default=300)
+    parser.add_argument('--birds', type=int, default=200)
+    parser.add_argument('--bullets', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='-', help='JSON-файл, `-` - стандартный вывод')
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    import pygame
+    from Simulation import MainLevelSimulation
+
+    pygame.init()
+    # Картинки спрайтов переводятся в формат экрана, поэтому он нужен даже без окна
+    pygame.display.set_mode((1280, 720))
+
+    rng = random.Random(args.seed)
+    simulation = MainLevelSimulation(seed=args.seed)
+    simulation.difficulty = simulation.rules.max_difficulty
+
+    grid_times, brute_times, entities = [], [], []
+    checks = hits = 0
+    mismatches = []
+    for frame in range(args.frames):
+        refill(simulation, rng, args.obstacles, args.birds, args.bullets)
+        # Только движение: правила уровня убрали бы столкнувшиеся объекты, и нагрузка бы падала
+        simulation.entities.update()
+        frame_queries = queries(simulation)
+
+        started = time.perf_counter_ns()
+        simulation.collision_grid.rebuild(
+            simulation.obstacle_sprites, simulation.bullet_booster_sprites, simulation.health_booster_sprites,
+        )
+        grid_hits = [simulation.collision_grid.spritecollide(sprite, group, False) for sprite, group in frame_queries]
+        grid_times.append(time.perf_counter_ns() - started)
+
+        started = time.perf_counter_ns()
+        brute_hits = [
+            pygame.sprite.spritecollide(sprite, group, False, pygame.sprite.collide_mask)
+            for sprite, group in frame_queries
+        ]
+        brute_times.append(time.perf_counter_ns() - started)
+
+        entities.append(len(simulation.entities))
+        checks += len(frame_queries)
+        for (sprite, _), grid, brute in zip(frame_queries, grid_hits, brute_hits):
+            hits += len(brute)
+            if set(grid) != set(brute):
+                mismatches.append({
+                    'frame': frame, 'sprite': type(sprite).__name__, 'rect': list(sprite.rect),
+                    'grid': len(grid), 'pygame': len(brute),
+                })
+
+    simulation.release()
+
+    grid_summary, brute_summary = percentiles(grid_times), percentiles(brute_times)
+    report = {
+        'commit': git_commit(),
+        'frames': args.frames,
+        'seed': args.seed,
+        'entities_mean': round(sum(entities) / len(entities), 1),
+        'entities_min': min(entities),
+        'checks': checks,
+        'hits': hits,
+        'grid': grid_summary,
+        'spritecollide': brute_summary,
+        'speedup': round(brute_summary['mean_us'] / grid_summary['mean_us'], 2) if grid_summary['mean_us'] else None,
+        'mismatches': mismatches[:20],
+        'mismatch_count': len(mismatches),
+    }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text + '\n')
+
+    if mismatches:
+        print(f'попадания сетки и pygame разошлись в {len(mismatches)} проверках', file=sys.stderr)
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
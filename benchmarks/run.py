@@ -0,0 +1,392 @@
+"""
+Замеры стоимости кадра в типичных сценариях игры. Игра запускается с драйвером SDL `dummy`, поэтому окно
+не нужно, а ввод в каждом сценарии задан заранее и seed уровня фиксирован, так что прогоны на разных
+коммитах сравнимы между собой. Каждый сценарий идет в отдельном процессе, чтобы пулы спрайтов, кэши
+и пиковая память одного сценария не влияли на другой.
+
+Кадр уровня - один шаг симуляции и отрисовка. Для каждого кадра отдельно замеряются обновление объектов,
+столкновения и отрисовка, затем кадры повторяются под `tracemalloc`, чтобы посчитать выделения памяти.
+Результат - JSON, например: `python benchmarks/run.py --output before.json`. Чтобы сравнить полную перерисовку
+с выводом изменившихся областей, прогоны делаются без `--dirty-rects` и с ним.
+"""
+
+import os
+
+# Окно не нужно, а приветствие pygame не должно попадать в JSON
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['SDL_AUDIODRIVER'] = 'dummy'
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PHASES = ('update', 'collision', 'draw')
+
+
+class FrameTimer:
+    """
+    Время фаз каждого кадра в наносекундах.
+    """
+
+    def __init__(self):
+        self.phases = {phase: [] for phase in PHASES}
+        self.entities = []
+        self.collision = 0
+
+    def add(self, update=0, collision=0, draw=0, entities=0):
+        self.phases['update'].append(update)
+        self.phases['collision'].append(collision)
+        self.phases['draw'].append(draw)
+        self.entities.append(entities)
+
+    def summary(self) -> dict:
+        result = {phase: percentiles(values) for phase, values in self.phases.items()}
+        result['frame'] = percentiles([sum(frame) for frame in zip(*self.phases.values())])
+        result['entities_mean'] = round(sum(self.entities) / len(self.entities), 1)
+        result['entities_max'] = max(self.entities)
+        return result
+
+
+def percentiles(values) -> dict:
+    """
+    Среднее, перцентили и максимум в микросекундах.
+    """
+
+    ordered = sorted(values)
+
+    def at(share):
+        return round(ordered[min(int(share * len(ordered)), len(ordered) - 1)] / 1000, 1)
+
+    return {
+        'mean_us': round(sum(ordered) / len(ordered) / 1000, 1),
+        'p50_us': at(0.5),
+        'p95_us': at(0.95),
+        'p99_us': at(0.99),
+        'max_us': round(ordered[-1] / 1000, 1),
+    }
+
+
+class LevelScenario:
+    """
+    Сценарий на игровом уровне. `inputs(frame)` возвращает ивенты кадра, `prepare(simulation)` настраивает
+    только что начатую игру, `before_frame(simulation, frame)` вмешивается в симуляцию перед шагом.
+    Конец игры не останавливает сценарий: симуляция продолжает идти, чтобы число кадров было одинаковым.
+    """
+
+    state = None
+
+    def __init__(self, game):
+        from StateMachine import GameState
+
+        self.game = game
+        self.loop = game.loops_by_state[GameState[self.state]]
+        game.state_machine.set_state(GameState[self.state])
+        self.loop.loop([])
+
+        self.timer = None
+        simulation = self.loop.simulation
+        original_update = simulation.update
+
+        # Столкновения проверяются в `update` симуляции, поэтому он замеряется отдельно от всего шага
+        def timed_update():
+            started = time.perf_counter_ns()
+            original_update()
+            self.timer.collision = time.perf_counter_ns() - started
+
+        simulation.update = timed_update
+        self.prepare(simulation)
+
+    def prepare(self, simulation):
+        pass
+
+    def inputs(self, frame: int) -> list:
+        return []
+
+    def before_frame(self, simulation, frame: int):
+        pass
+
+    def frame(self, timer: FrameTimer, frame: int):
+        self.timer = timer
+        loop, simulation = self.loop, self.loop.simulation
+
+        for event in self.inputs(frame):
+            loop.handle_event(event)
+        self.before_frame(simulation, frame)
+
+        started = time.perf_counter_ns()
+        simulation.step()
+        stepped = time.perf_counter_ns()
+        loop.draw()
+        drawn = time.perf_counter_ns()
+
+        timer.add(
+            update=stepped - started - timer.collision, collision=timer.collision, draw=drawn - stepped,
+            entities=len(simulation.entities),
+        )
+
+
+class MenuIdle:
+    """
+    Главное меню: кадр перерисовывается в ответ на движение мыши.
+    """
+
+    def __init__(self, game):
+        import pygame
+        from StateMachine import GameState
+
+        self.pygame = pygame
+        self.loop = game.loops_by_state[GameState.MAIN_MENU]
+        game.state_machine.set_state(GameState.MAIN_MENU)
+        self.loop.loop([])
+
+    def frame(self, timer: FrameTimer, frame: int):
+        pygame = self.pygame
+        event = pygame.event.Event(pygame.MOUSEMOTION, pos=(frame % 1280, 360), rel=(1, 0), buttons=(0, 0, 0))
+
+        started = time.perf_counter_ns()
+        self.loop.loop([event])
+        timer.add(draw=time.perf_counter_ns() - started, entities=len(self.loop.all_sprites))
+
+
+class MainLevelEarly(LevelScenario):
+    """
+    Начало основного уровня: игрок прыгает и иногда стреляет.
+    """
+
+    state = 'MAIN_LEVEL_PLAYING'
+
+    def inputs(self, frame):
+        import pygame
+
+        if frame % 70 == 0:
+            return [pygame.event.Event(pygame.KEYDOWN, key=pygame.K_SPACE)]
+        if frame % 120 == 30:
+            return [pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=(0, 0))]
+        return []
+
+
+class MainLevelLate(MainLevelEarly):
+    """
+    Основной уровень на максимальной сложности: больше всего объектов и самая высокая скорость.
+    """
+
+    def prepare(self, simulation):
+        simulation.difficulty = simulation.rules.max_difficulty
+
+
+class BirdLevel(LevelScenario):
+    """
+    Уровень "Я - птица": игрок летает вверх и вниз.
+    """
+
+    state = 'IM_A_BIRD_LEVEL_PLAYING'
+
+    def inputs(self, frame):
+        import pygame
+
+        if frame % 60 == 0:
+            return [pygame.event.Event(pygame.KEYDOWN, key=pygame.K_UP if frame % 120 else pygame.K_DOWN)]
+        if frame % 60 == 20:
+            return [pygame.event.Event(pygame.KEYUP, key=pygame.K_UP)]
+        return []
+
+
+class EntityFlood(MainLevelLate):
+    """
+    Искусственная нагрузка: на основном уровне каждые несколько кадров появляются лишние препятствия и птицы,
+    а игрок стреляет, пока есть пули. Проверяет пулы спрайтов, сетку столкновений и отрисовку под нагрузкой.
+    """
+
+    def prepare(self, simulation):
+        super().prepare(simulation)
+        simulation.bullets = 10 ** 6
+
+    def before_frame(self, simulation, frame):
+        import Sprites
+
+        if frame % 3 == 0:
+            simulation.spawn(
+                Sprites.ObstacleSprite, simulation.obstacle_sprites,
+                x=simulation.width, y=515, move_speed=simulation.move_speed,
+            )
+        if frame % 5 == 0:
+            simulation.spawn(
+                Sprites.MovingBirdSprite, simulation.obstacle_sprites, simulation.birds_sprites,
+                x=simulation.width, y=150 - frame % 100, move_speed=simulation.move_speed,
+            )
+        if frame % 4 == 0:
+            simulation.fire()
+
+
+class MainLevelParallax(MainLevelLate):
+    """
+    Основной уровень на максимальной сложности с плывущими облаками: прокручиваемая полоса `ParallaxLayer`
+    и надписи интерфейса поверх нее рисуются в каждом кадре.
+    """
+
+    def __init__(self, game):
+        # Слои уровня собираются при первом входе на него, поэтому полосы включаются до этого
+        game.parallax = True
+        super().__init__(game)
+
+
+SCENARIOS = {
+    'menu_idle': MenuIdle,
+    'main_level_early': MainLevelEarly,
+    'main_level_late': MainLevelLate,
+    'bird_level': BirdLevel,
+    'entity_flood': EntityFlood,
+    'main_level_parallax': MainLevelParallax,
+}
+
+
+def run_scenario(name: str, frames: int, warmup: int, allocation_frames: int, seed: int, render_size=None,
+                 dirty_rects=False) -> dict:
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+
+    from BirdsGame import BirdsGame
+
+    # Таблица рекордов сценариев не должна попадать в настоящую
+    with tempfile.TemporaryDirectory() as directory:
+        game = BirdsGame.create(
+            leaderboard_path=os.path.join(directory, 'leaderboard.sqlite'), render_size=render_size,
+            dirty_rects=dirty_rects,
+        )
+        # Seed игры на уровне берется из общего генератора, поэтому фиксируется здесь
+        random.seed(seed)
+
+        started = time.perf_counter()
+        scenario = SCENARIOS[name](game)
+        startup_ms = (time.perf_counter() - started) * 1000
+
+        warmup_timer = FrameTimer()
+        for frame in range(warmup):
+            scenario.frame(warmup_timer, frame)
+
+        timer = FrameTimer()
+        for frame in range(warmup, warmup + frames):
+            scenario.frame(timer, frame)
+
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        blocks_before = sys.getallocatedblocks()
+        for frame in range(warmup + frames, warmup + frames + allocation_frames):
+            scenario.frame(FrameTimer(), frame)
+        blocks_after = sys.getallocatedblocks()
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        growth = [stat for stat in after.compare_to(before, 'lineno') if stat.size_diff > 0]
+        result = timer.summary()
+        result.update({
+            'frames': frames,
+            'startup_ms': round(startup_ms, 1),
+            'memory': {
+                'traced_peak_kib': round(peak / 1024, 1),
+                'traced_current_kib': round(current / 1024, 1),
+                # Блоки, которые остались занятыми после кадров: рост здесь означает утечку
+                'retained_blocks_per_frame': round((blocks_after - blocks_before) / allocation_frames, 2),
+                'top_growth': [
+                    {'where': str(stat.traceback), 'kib': round(stat.size_diff / 1024, 1), 'count': stat.count_diff}
+                    for stat in growth[:5]
+                ],
+                'max_rss_kib': max_rss_kib(),
+            },
+        })
+
+        game.leaderboard.close()
+
+    return result
+
+
+def max_rss_kib():
+    try:
+        import resource
+    except ImportError:
+        # На Windows модуля resource нет
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замеры стоимости кадра в сценариях игры')
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                        help='сценарий для замера; можно указать несколько раз, по умолчанию все')
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--warmup', type=int, default=120)
+    parser.add_argument('--allocation-frames', type=int, default=120)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--render-size', default=None, help='размер кадра, например 640x360; по умолчанию 1280x720')
+    parser.add_argument('--dirty-rects', action='store_true',
+                        help='выводить только изменившиеся области кадра, как `main.py --dirty-rects`')
+    parser.add_argument('--output', default='-', help='JSON-файл, `-` - стандартный вывод')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        render_size = tuple(int(side) for side in args.render_size.split('x')) if args.render_size else None
+        result = run_scenario(
+            args.scenario[0], args.frames, args.warmup, args.allocation_frames, args.seed, render_size,
+            args.dirty_rects,
+        )
+        json.dump(result, sys.stdout)
+        return
+
+    import pygame.version
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'platform': platform.platform(),
+        'frames': args.frames,
+        'seed': args.seed,
+        'render_size': args.render_size or '1280x720',
+        # Режим вывода кадра: только изменившиеся области или весь экран
+        'dirty_rects': args.dirty_rects,
+        'scenarios': {},
+    }
+
+    for name in args.scenario or SCENARIOS:
+        command = [
+            sys.executable, os.path.abspath(__file__), '--child', '--scenario', name,
+            '--frames', str(args.frames), '--warmup', str(args.warmup),
+            '--allocation-frames', str(args.allocation_frames), '--seed', str(args.seed),
+        ]
+        if args.render_size:
+            command += ['--render-size', args.render_size]
+        if args.dirty_rects:
+            command.append('--dirty-rects')
+        child = subprocess.run(command, capture_output=True, text=True, check=True)
+        report['scenarios'][name] = json.loads(child.stdout)
+        print(f'{name}: {report["scenarios"][name]["frame"]["mean_us"]} мкс на кадр', file=sys.stderr)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
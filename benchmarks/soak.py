@@ -0,0 +1,186 @@
+"""
+Долгий прогон с сотнями перезапусков уровней: проверяет, что память и стоимость кадра не растут от игры к игре.
+Каждая игра идет через настоящие игровые циклы и машину состояний: уровень, пауза и продолжение, проигрыш,
+затем перезапуск с экрана проигрыша или выход в главное меню. Уровни чередуются.
+
+Первые игры заполняют пулы и кэши, поэтому сравниваются начало и конец остальной части прогона.
+Если память или время кадра выросли больше допустимого, скрипт завершается с кодом 1.
+Пример: `python benchmarks/soak.py --restarts 300 --output soak.json`
+"""
+
+import os
+
+# Окно не нужно, а приветствие pygame не должно попадать в JSON
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['SDL_AUDIODRIVER'] = 'dummy'
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+
+import argparse
+import gc
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from run import ROOT, git_commit, max_rss_kib
+
+
+def level_inputs(level: str, frame: int) -> list:
+    import pygame
+
+    if level == 'main':
+        if frame % 70 == 0:
+            return [pygame.event.Event(pygame.KEYDOWN, key=pygame.K_SPACE)]
+        if frame % 120 == 30:
+            return [pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=(0, 0))]
+        return []
+
+    if frame % 60 == 0:
+        return [pygame.event.Event(pygame.KEYDOWN, key=pygame.K_UP if frame % 120 else pygame.K_DOWN)]
+    if frame % 60 == 20:
+        return [pygame.event.Event(pygame.KEYUP, key=pygame.K_UP)]
+    return []
+
+
+def play_session(game, level: str, frames: int, exit_to_menu: bool) -> list:
+    """
+    Играет одну игру на уровне и возвращает время каждого кадра уровня в наносекундах.
+    """
+
+    import pygame
+    from Sprites import TICKS_PER_SECOND
+    from StateMachine import GameState
+
+    state = GameState.MAIN_LEVEL_PLAYING if level == 'main' else GameState.IM_A_BIRD_LEVEL_PLAYING
+    machine = game.state_machine
+    if machine.state != state:
+        machine.set_state(state)
+    loop = game.loops_by_state[state]
+
+    durations = []
+    for frame in range(frames):
+        if frame == frames // 2:
+            # Пауза посреди игры и продолжение, как после нажатия на кнопку
+            loop.handle_event(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_ESCAPE))
+            game.loops_by_state[GameState.PAUSE_MENU].loop([])
+            machine.set_state(state, level=level)
+        if frame == frames - 1 and not loop.simulation.game_over:
+            loop.simulation.game_over = True
+
+        # Ровно один шаг симуляции за кадр, сколько бы ни длился прошлый кадр
+        loop.last_time = time.perf_counter() - 1 / TICKS_PER_SECOND
+        started = time.perf_counter_ns()
+        loop.loop(level_inputs(level, frame))
+        durations.append(time.perf_counter_ns() - started)
+
+        if machine.state == GameState.GAME_OVER:
+            break
+
+    game.loops_by_state[GameState.GAME_OVER].loop([])
+    # С экрана проигрыша игра либо перезапускается, либо уходит в главное меню
+    if exit_to_menu:
+        machine.set_state(GameState.MAIN_MENU)
+        game.loops_by_state[GameState.MAIN_MENU].loop([])
+    return durations
+
+
+def snapshot(game) -> dict:
+    import Sprites
+
+    gc.collect()
+    return {
+        'allocated_blocks': sys.getallocatedblocks(),
+        'gc_objects': len(gc.get_objects()),
+        'all_sprites': len(game.all_sprites),
+        'pause_menu': len(game.pause_menu),
+        'pooled_free': sum(pool.size for pool in Sprites.sprite_pools.values()),
+    }
+
+
+def window_mean(sessions: list, key: str, start: float, end: float) -> float:
+    part = sessions[int(start * len(sessions)):max(int(end * len(sessions)), int(start * len(sessions)) + 1)]
+    return statistics.fmean(session[key] for session in part)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Долгий прогон с перезапусками уровней')
+    parser.add_argument('--restarts', type=int, default=200)
+    parser.add_argument('--frames', type=int, default=240, help='наибольшее число кадров одной игры')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--max-block-growth', type=int, default=2000,
+                        help='допустимый рост числа занятых блоков памяти Python')
+    parser.add_argument('--max-frame-growth', type=float, default=1.3,
+                        help='допустимое отношение медианы кадра в конце прогона к началу')
+    parser.add_argument('--output', default='-', help='JSON-файл, `-` - стандартный вывод')
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    from BirdsGame import BirdsGame
+    from StateMachine import GameState
+
+    sessions = []
+    with tempfile.TemporaryDirectory() as directory:
+        game = BirdsGame.create(leaderboard_path=os.path.join(directory, 'leaderboard.sqlite'))
+        # Seed игр берется из общего генератора, поэтому фиксируется здесь
+        random.seed(args.seed)
+        game.state_machine.set_state(GameState.MAIN_MENU)
+        game.loops_by_state[GameState.MAIN_MENU].loop([])
+
+        for session in range(args.restarts):
+            level = 'main' if session % 2 == 0 else 'bird'
+            # Выход в меню - после каждой третьей игры, иначе перезапуск с экрана проигрыша
+            durations = play_session(game, level, args.frames, exit_to_menu=session % 3 == 2)
+            sessions.append({
+                'level': level,
+                'frames': len(durations),
+                'frame_median_us': round(statistics.median(durations) / 1000, 1),
+                **snapshot(game),
+            })
+
+        game.leaderboard.close()
+
+    # Первые 10% игр заполняют пулы и кэши. Начало - следующие 20%, конец - последние 20%
+    growth = {
+        key: round(window_mean(sessions, key, 0.8, 1.0) - window_mean(sessions, key, 0.1, 0.3), 1)
+        for key in ('allocated_blocks', 'gc_objects', 'pooled_free')
+    }
+    frame_ratio = (
+        window_mean(sessions, 'frame_median_us', 0.8, 1.0) / window_mean(sessions, 'frame_median_us', 0.1, 0.3)
+    )
+
+    failures = []
+    if growth['allocated_blocks'] > args.max_block_growth:
+        failures.append(f'занятых блоков памяти стало больше на {growth["allocated_blocks"]}')
+    if frame_ratio > args.max_frame_growth:
+        failures.append(f'медиана кадра выросла в {frame_ratio:.2f} раза')
+    if max(session['pause_menu'] for session in sessions) > min(session['pause_menu'] for session in sessions):
+        failures.append('меню паузы накапливает спрайты')
+
+    report = {
+        'commit': git_commit(),
+        'restarts': args.restarts,
+        'growth': growth,
+        'frame_ratio': round(frame_ratio, 3),
+        'max_rss_kib': max_rss_kib(),
+        'failures': failures,
+        'sessions': sessions,
+    }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text + '\n')
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
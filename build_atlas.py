@@ -0,0 +1,114 @@
+"""
+Упаковывает изображения из `assets/images` в несколько атласов и записывает индекс `имя -> (атлас, прямоугольник)`
+вместе с sha1 исходного файла: если картинку изменили, а атлас не пересобрали, игра берет ее из отдельного файла.
+Полноэкранные фоны в атлас не попадают: их и так рисуют одним блитом, а в атласе они только увеличивают
+время распаковки. Запускается вручную после изменения картинок: `python build_atlas.py`.
+"""
+
+import hashlib
+import json
+import os
+
+import pygame
+
+IMAGES_DIR = os.path.join('assets', 'images')
+ATLAS_DIR = os.path.join('assets', 'atlas')
+INDEX_PATH = os.path.join(ATLAS_DIR, 'index.json')
+
+MAX_WIDTH = 2048
+PADDING = 2
+
+# Фоны, которые остаются отдельными файлами
+BACKGROUNDS = ['main_menu_background.png', 'ground.png', 'pause_dark_background.png']
+
+# Изображения, которые показываются вместе, лежат в одном атласе.
+# Все остальные картинки, кроме фонов, попадают в атлас `misc`
+ATLASES = {
+    'menu': [
+        'clouds.png', 'player.png', 'bird.png', 'game_name.png',
+        'play_btn.png', 'bird_mode_btn.png', 'records_btn.png', 'exit_btn.png',
+    ],
+    'level': [
+        'animated_player.png', 'animated_player_to_left.png', 'bird_animation_to_right.png',
+        'plane.png', 'Bird.png', 'heart.png', 'score.png', 'obstacle.png', 'health_booster.png',
+        'bullet_icon.png', 'bullet_booster.png', 'bullet.png', 'bullet_to_left.png',
+    ],
+    'dialogs': [
+        'pause_background.png', 'game_over_background.png', 'game_over_text.png',
+        'you_got_points.png', 'restart_btn.png', 'continuation_btn.png', 'return_to_main_menu_btn.png',
+    ],
+}
+
+
+def pack(sizes):
+    """
+    Раскладывает прямоугольники по полкам: сначала самые высокие, слева направо, пока помещаются в `MAX_WIDTH`.
+    Возвращает позиции прямоугольников и размер атласа.
+    """
+
+    positions = {}
+    x = y = shelf_height = width = 0
+
+    for name, (w, h) in sorted(sizes.items(), key=lambda item: (-item[1][1], -item[1][0], item[0])):
+        if x and x + w > MAX_WIDTH:
+            x, y = 0, y + shelf_height + PADDING
+            shelf_height = 0
+
+        positions[name] = (x, y)
+        x += w + PADDING
+        shelf_height = max(shelf_height, h)
+        width = max(width, x - PADDING)
+
+    return positions, (width, y + shelf_height)
+
+
+def build():
+    names = sorted(name for name in os.listdir(IMAGES_DIR) if name.endswith('.png') and name not in BACKGROUNDS)
+    grouped = {name: atlas for atlas, atlas_names in ATLASES.items() for name in atlas_names}
+
+    os.makedirs(ATLAS_DIR, exist_ok=True)
+    index = {}
+
+    for atlas in [*ATLASES, 'misc']:
+        images = {}
+        # Одинаковые картинки под разными именами хранятся в атласе один раз
+        duplicates = {}
+        digests = {}
+        for name in names:
+            if grouped.get(name, 'misc') != atlas:
+                continue
+
+            with open(os.path.join(IMAGES_DIR, name), 'rb') as file:
+                digest = hashlib.sha1(file.read()).hexdigest()
+            digests[name] = digest
+            if digest in duplicates:
+                duplicates[digest].append(name)
+                continue
+
+            duplicates[digest] = [name]
+            images[name] = pygame.image.load(os.path.join(IMAGES_DIR, name))
+
+        if not images:
+            continue
+
+        positions, size = pack({name: image.get_size() for name, image in images.items()})
+        sheet = pygame.Surface(size, pygame.SRCALPHA, 32)
+        for name, image in images.items():
+            # Атлас изначально прозрачный, поэтому сложение копирует пиксели без смешивания
+            sheet.blit(image, positions[name], special_flags=pygame.BLEND_RGBA_ADD)
+
+        pygame.image.save(sheet, os.path.join(ATLAS_DIR, f'{atlas}.png'))
+
+        for same_names in duplicates.values():
+            rect = [*positions[same_names[0]], *images[same_names[0]].get_size()]
+            for name in same_names:
+                index[name] = {'atlas': f'{atlas}.png', 'rect': rect, 'sha1': digests[name]}
+
+        print(f'{atlas}.png: {size[0]}x{size[1]}, {len(images)} изображений')
+
+    with open(INDEX_PATH, 'w', encoding='utf-8') as file:
+        json.dump(index, file, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    build()
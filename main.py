@@ -1,5 +1,39 @@
+import argparse
+
 from BirdsGame import BirdsGame
 
+
+def resolution(value: str):
+    width, _, height = value.partition('x')
+    try:
+        return int(width), int(height)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'ожидается размер вида 960x540, а не {value!r}')
+
+
 if __name__ == "__main__":
-    game = BirdsGame.create(fullscreen=False)
+    parser = argparse.ArgumentParser(description='Birds Game')
+    parser.add_argument('--fullscreen', action='store_true')
+    parser.add_argument('--resolution', type=resolution, default=None, metavar='ШИРИНАxВЫСОТА',
+                        help='размер, в котором рисуется кадр, например 640x360 или 960x540; по умолчанию 1280x720')
+    parser.add_argument('--parallax', action='store_true', help='плывущие облака на уровнях')
+    parser.add_argument('--dirty-rects', action='store_true',
+                        help='выводить на экран только изменившиеся области кадра вместо полной перерисовки')
+    parser.add_argument('--replays', metavar='DIR', default=None,
+                        help='папка, в которую сохраняются записи ввода законченных игр для воспроизведения')
+    parser.add_argument('--profile-overlay', action='store_true',
+                        help='показывать время фаз кадра поверх игры (F3 - включить или выключить)')
+    parser.add_argument('--profile', metavar='PATH', default=None,
+                        help='JSONL-файл, в который дописывается статистика кадров')
+    args = parser.parse_args()
+
+    game = BirdsGame.create(
+        fullscreen=args.fullscreen,
+        dirty_rects=args.dirty_rects,
+        replays_dir=args.replays,
+        render_size=args.resolution,
+        parallax=args.parallax,
+        profile_overlay=args.profile_overlay,
+        profile_path=args.profile,
+    )
     game.start_game()